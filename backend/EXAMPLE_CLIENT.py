@@ -1,6 +1,26 @@
+import json
+import struct
+
 import requests
 import numpy as np
 
+
+def decode_raw(payload):
+    """Decode a raw (application/octet-stream) response.
+
+    Layout: uint32 little-endian header length, JSON header (shapes, dtypes,
+    byte offsets and coordinates), then the little-endian float32 buffers.
+    """
+    (n,) = struct.unpack_from('<I', payload, 0)
+    header = json.loads(payload[4:4 + n])
+    arrays = {}
+    for entry in header['arrays']:
+        count = int(np.prod(entry['shape']))
+        arrays[entry['name']] = np.frombuffer(payload, dtype=entry['dtype'], count=count,
+                                              offset=4 + n + entry['offset']).reshape(entry['shape'])
+    return arrays, header
+
+
 url = 'http://localhost:8000/simulate'
 req = {
     'n_neurons': 50,
@@ -10,15 +30,14 @@ req = {
     't_max': 0.01,
     'sensor_res': 32,
 }
-resp = requests.post(url, json=req)
+# ask for the binary form; omit the Accept header to get the JSON lists instead
+resp = requests.post(url, json=req, headers={'Accept': 'application/octet-stream'})
 resp.raise_for_status()
-data = resp.json()
-xs = np.array(data['xs'])
-ys = np.array(data['ys'])
-times = np.array(data['times'])
-Bshape = tuple(data['Bshape'])
-Bflat = np.array(data['B'])
-B = Bflat.reshape(Bshape)
+arrays, header = decode_raw(resp.content)
+xs = np.array(header['xs'])
+ys = np.array(header['ys'])
+times = np.array(header['times'])
+B = arrays['B']  # (N_sensors, n_time, 3) float32
 print('B shape:', B.shape)
 # Example: magnitude at time index 0
 mag0 = np.linalg.norm(B[:,0,:], axis=1)
@@ -0,0 +1,91 @@
+"""Speed, memory and accuracy of the float32 pipeline against float64, stage by stage.
+
+Each float32 stage gets the float64 input rounded to float32, so the errors
+are per stage rather than compounded. Errors are max |x32 - x64| / max |x64|.
+A second table evaluates sensors placed a distance d from a segment, where
+the float64 sensor offsets of _kernel_block keep float32 usable.
+
+Run from the backend directory:
+
+    python benchmarks/bench_dtype.py --n-neurons 200 --sensor-res 32 --n-time 40
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulation.field import compute_field_timeseries  # noqa: E402
+from odmr import add_noise, field_to_frequency_shift  # noqa: E402
+from denoiser import gaussian_denoise, stencil_smoothing  # noqa: E402
+from bench_parallel import build_problem  # noqa: E402
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def rel_err(x32, x64):
+    return float(np.abs(x32.astype(float) - x64).max() / np.abs(x64).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n-neurons', type=int, default=200)
+    parser.add_argument('--sensor-res', type=int, default=32)
+    parser.add_argument('--n-time', type=int, default=40)
+    args = parser.parse_args()
+
+    table, currents, sensors = build_problem(args.n_neurons, args.sensor_res, args.n_time)
+    xs = np.linspace(0.0, 1.0, args.sensor_res)
+    print(f"sensors={sensors.shape[0]} segments={currents.shape[1]} timesteps={currents.shape[0]}")
+    print(f"{'stage':<20} {'f64 s':>8} {'f32 s':>8} {'speedup':>8} {'f32 MB':>8} {'max rel err':>12}")
+
+    def report(label, f64, f32):
+        (x64, t64), (x32, t32) = f64, f32
+        print(f"{label:<20} {t64:>8.3f} {t32:>8.3f} {t64 / t32:>8.2f} {x32.nbytes / 1e6:>8.1f} "
+              f"{rel_err(x32, x64):>12.2e}")
+        return x64
+
+    for kernel in ('midpoint', 'segment'):
+        B = report(f"Btime ({kernel})",
+                   timed(lambda: compute_field_timeseries(table['start'], table['end'], currents, sensors,
+                                                          kernel=kernel)),
+                   timed(lambda: compute_field_timeseries(table['start'], table['end'], currents, sensors,
+                                                          kernel=kernel, dtype=np.float32)))
+    B32 = B.astype(np.float32)
+    df = report('df_clean', timed(lambda: field_to_frequency_shift(B)), timed(lambda: field_to_frequency_shift(B32)))
+    noisy = add_noise(df, noise_level=0.1, rng=np.random.default_rng(0))
+    noisy32 = noisy.astype(np.float32)
+    grid = (args.sensor_res, args.sensor_res)
+    smooth = report('gaussian_denoise', timed(lambda: gaussian_denoise(noisy, grid, 1.0, 1.0)),
+                    timed(lambda: gaussian_denoise(noisy32, grid, 1.0, 1.0)))
+    smooth32 = smooth.astype(np.float32)
+    report('stencil_smoothing', timed(lambda: stencil_smoothing(smooth, xs, xs)),
+           timed(lambda: stencil_smoothing(smooth32, xs, xs)))
+
+    # a sensor at distance d from the middle of one segment, perpendicular to it
+    start, end = table['start'][:1], table['end'][:1]
+    dl = end[0] - start[0]
+    normal = np.cross(dl, [0.0, 0.0, 1.0])
+    normal /= np.linalg.norm(normal)
+    one = np.ones((1, 1))
+    print(f"\nsegment length {np.linalg.norm(dl):.2e}, sensor at distance d from its midpoint")
+    print(f"{'d':>8} {'midpoint err':>13} {'segment err':>12}")
+    for d in (1e-1, 1e-3, 1e-5, 1e-7):
+        point = (0.5 * (start[0] + end[0]) + d * normal)[None, :]
+        errs = []
+        for kernel in ('midpoint', 'segment'):
+            b64 = compute_field_timeseries(start, end, one, point, kernel=kernel)
+            b32 = compute_field_timeseries(start, end, one, point, kernel=kernel, dtype=np.float32)
+            errs.append(rel_err(b32, b64))
+        print(f"{d:>8.0e} {errs[0]:>13.2e} {errs[1]:>12.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Speed, peak memory and accuracy of the fft engine against the exact kernel engine.
+
+Errors are relative L2 norms of B over all sensors and timesteps; peak
+memory is the largest traced NumPy allocation during each engine's run.
+
+Run from the backend directory:
+
+    python benchmarks/bench_fft.py --n-neurons 100 --sensor-res 64,128,256 --n-time 40
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulation.field import compute_field_timeseries  # noqa: E402
+from simulation.fft import compute_field_timeseries_fft  # noqa: E402
+from bench_parallel import build_problem  # noqa: E402
+
+
+def traced(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n-neurons', type=int, default=100)
+    parser.add_argument('--sensor-res', default='64,128,256')
+    parser.add_argument('--n-time', type=int, default=40)
+    parser.add_argument('--n-slabs', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'res':>5} {'kernel s':>9} {'MB':>6} {'fft s':>8} {'MB':>6} {'speedup':>8} {'rel L2 err':>11}")
+    for res in (int(v) for v in args.sensor_res.split(',')):
+        table, currents, sensors = build_problem(args.n_neurons, res, args.n_time)
+        xs = np.linspace(0.0, 1.0, res)
+        ref, t_ref, m_ref = traced(lambda: compute_field_timeseries(table['start'], table['end'], currents, sensors))
+        B, t_fft, m_fft = traced(lambda: compute_field_timeseries_fft(table['start'], table['end'], currents, xs, xs,
+                                                                      n_slabs=args.n_slabs))
+        err = np.linalg.norm(B - ref) / np.linalg.norm(ref)
+        print(f"{res:>5} {t_ref:>9.2f} {m_ref / 1e6:>6.0f} {t_fft:>8.2f} {m_fft / 1e6:>6.0f} "
+              f"{t_ref / t_fft:>8.2f} {err:>11.2e}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
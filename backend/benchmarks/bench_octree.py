@@ -0,0 +1,56 @@
+"""Error-vs-speed report for the octree (Barnes-Hut) engine against the exact solver.
+
+Run from the backend directory:
+
+    python benchmarks/bench_octree.py --n-neurons 500 --sensor-res 48 --n-time 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulation.field import compute_field_timeseries  # noqa: E402
+from simulation.octree import build_segment_octree, compute_field_timeseries_octree  # noqa: E402
+from bench_parallel import build_problem  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n-neurons', type=int, default=500)
+    parser.add_argument('--sensor-res', type=int, default=48)
+    parser.add_argument('--n-time', type=int, default=20)
+    parser.add_argument('--leaf-size', type=int, default=64)
+    parser.add_argument('--thetas', default='0.1,0.2,0.35,0.5,0.7,1.0')
+    args = parser.parse_args()
+
+    table, currents, sensors = build_problem(args.n_neurons, args.sensor_res, args.n_time)
+    print(f"sensors={sensors.shape[0]} segments={currents.shape[1]} timesteps={currents.shape[0]}")
+
+    t0 = time.perf_counter()
+    exact = compute_field_timeseries(table['start'], table['end'], currents, sensors)
+    t_exact = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    tree = build_segment_octree(table['start'], table['end'], leaf_size=args.leaf_size)
+    t_build = time.perf_counter() - t0
+    print(f"exact kernel engine: {t_exact:.3f}s   octree build: {t_build:.3f}s ({len(tree['lo'])} nodes)")
+
+    print(f"{'theta':>6} {'order':>5} {'seconds':>9} {'speedup':>8} {'rel L2 err':>11} {'max rel err':>11}")
+    scale = np.abs(exact).max()
+    for theta in (float(v) for v in args.thetas.split(',')):
+        for order in (0, 1):
+            t0 = time.perf_counter()
+            approx = compute_field_timeseries_octree(table['start'], table['end'], currents, sensors,
+                                                     theta=theta, order=order, tree=tree)
+            elapsed = time.perf_counter() - t0
+            l2 = np.linalg.norm(approx - exact) / np.linalg.norm(exact)
+            linf = np.abs(approx - exact).max() / scale
+            print(f"{theta:>6.2f} {order:>5} {elapsed:>9.3f} {t_exact / elapsed:>8.2f} {l2:>11.2e} {linf:>11.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Throughput of the online (frame-by-frame) denoiser in frames per second.
+
+Run from the backend directory:
+
+    python benchmarks/bench_online.py --sensor-res 64 --n-frames 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from denoiser import OnlineDenoiser, gaussian_denoise  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensor-res', type=int, default=64)
+    parser.add_argument('--n-frames', type=int, default=2000)
+    parser.add_argument('--spatial-sigma', type=float, default=1.0)
+    parser.add_argument('--temporal-sigma', type=float, default=2.0)
+    parser.add_argument('--chunks', default='1,8,64', help='frames per push')
+    parser.add_argument('--dtypes', default='float32,float64')
+    args = parser.parse_args()
+
+    n = args.sensor_res
+    df = np.random.default_rng(0).normal(size=(n * n, args.n_frames)).astype(np.float32)
+    t0 = time.perf_counter()
+    offline = gaussian_denoise(df, (n, n), args.spatial_sigma, args.temporal_sigma, method='fir')
+    t_offline = time.perf_counter() - t0
+    print(f"sensors={n * n} frames={args.n_frames}  offline fir: {args.n_frames / t_offline:9.0f} frames/s")
+
+    print(f"{'mode':<8} {'dtype':<8} {'chunk':>6} {'latency':>8} {'frames/s':>10} {'max |diff| interior':>20}")
+    for dtype in args.dtypes.split(','):
+        for mode, lag in (('causal', 0), ('lag', None)):
+            for chunk in (int(c) for c in args.chunks.split(',')):
+                den = OnlineDenoiser((n, n), args.spatial_sigma, args.temporal_sigma, lag=lag, dtype=dtype)
+                t0 = time.perf_counter()
+                parts = [den.push(df[:, i:i + chunk]) for i in range(0, args.n_frames, chunk)]
+                parts.append(den.flush())
+                seconds = time.perf_counter() - t0
+                out = np.concatenate(parts, axis=1)
+                r = den.radius
+                diff = np.abs(out - offline)[:, r:-r].max() if mode == 'lag' else float('nan')
+                print(f"{mode:<8} {dtype:<8} {chunk:>6} {den.lag:>8} {args.n_frames / seconds:>10.0f} {diff:>20.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Scaling benchmark for the parallel field engines.
+
+Run from the backend directory:
+
+    python benchmarks/bench_parallel.py --n-neurons 200 --sensor-res 48 --n-time 40
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulation.neuron import generate_neuron_population  # noqa: E402
+from simulation.field import compute_field_timeseries, compute_field_timeseries_direct  # noqa: E402
+from simulation.segments import pack_neuron_segments, segment_currents  # noqa: E402
+
+
+def build_problem(n_neurons, sensor_res, n_time, seed=0):
+    rng = np.random.default_rng(seed)
+    neurons = generate_neuron_population(n_neurons=n_neurons, mean_length=0.5, rng=rng)
+    table = pack_neuron_segments(neurons)
+    currents = segment_currents(table, np.linspace(0, 0.01, n_time))
+    xs = np.linspace(0.0, 1.0, sensor_res)
+    XX, YY = np.meshgrid(xs, xs)
+    sensors = np.stack([XX.ravel(), YY.ravel(), np.zeros(XX.size)], axis=1)
+    return table, currents, sensors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n-neurons', type=int, default=200)
+    parser.add_argument('--sensor-res', type=int, default=48)
+    parser.add_argument('--n-time', type=int, default=40)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--engines', default='kernel,direct')
+    parser.add_argument('--executors', default='thread,process')
+    args = parser.parse_args()
+
+    table, currents, sensors = build_problem(args.n_neurons, args.sensor_res, args.n_time)
+    print(f"sensors={sensors.shape[0]} segments={currents.shape[1]} timesteps={currents.shape[0]}")
+    engines = {'kernel': compute_field_timeseries, 'direct': compute_field_timeseries_direct}
+
+    worker_counts = sorted({1, *[w for w in (2, 4, 8, 16, 32, 64) if w <= args.max_workers], args.max_workers})
+    print(f"{'engine':<8} {'executor':<8} {'workers':>7} {'seconds':>9} {'speedup':>8}")
+    for engine in args.engines.split(','):
+        fn = engines[engine]
+        for executor in args.executors.split(','):
+            baseline = None
+            for workers in worker_counts:
+                t0 = time.perf_counter()
+                fn(table['start'], table['end'], currents, sensors, workers=workers, executor=executor)
+                elapsed = time.perf_counter() - t0
+                baseline = baseline or elapsed
+                print(f"{engine:<8} {executor:<8} {workers:>7} {elapsed:>9.3f} {baseline / elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
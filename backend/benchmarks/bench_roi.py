@@ -0,0 +1,57 @@
+"""Cost of region-of-interest evaluation and the error of the segment cutoff.
+
+The full grid without a cutoff is the reference; ROI rows are compared
+against the same sensors of the full result.
+
+Run from the backend directory:
+
+    python benchmarks/bench_roi.py --n-neurons 200 --sensor-res 32 --n-time 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulation.field import compute_field_timeseries  # noqa: E402
+from bench_parallel import build_problem  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n-neurons', type=int, default=200)
+    parser.add_argument('--sensor-res', type=int, default=32)
+    parser.add_argument('--n-time', type=int, default=20)
+    parser.add_argument('--roi-size', type=float, default=0.25)
+    parser.add_argument('--cutoffs', default='0.1,0.25,0.5,1')
+    args = parser.parse_args()
+
+    table, currents, sensors = build_problem(args.n_neurons, args.sensor_res, args.n_time)
+    start, end = table['start'], table['end']
+    print(f"sensors={sensors.shape[0]} segments={currents.shape[1]} timesteps={currents.shape[0]}")
+
+    t0 = time.perf_counter()
+    full = compute_field_timeseries(start, end, currents, sensors)
+    t_full = time.perf_counter() - t0
+    lo = 0.5 - args.roi_size / 2
+    roi = np.flatnonzero(np.all((sensors[:, :2] >= lo) & (sensors[:, :2] <= lo + args.roi_size), axis=1))
+
+    print(f"{'sensors':<10} {'cutoff':>7} {'n':>6} {'seconds':>9} {'speedup':>8} {'rel L2 err':>11}")
+    print(f"{'full':<10} {'-':>7} {sensors.shape[0]:>6} {t_full:>9.3f} {1.0:>8.2f} {0.0:>11.2e}")
+    for label, idx in (('full', np.arange(sensors.shape[0])), ('roi', roi)):
+        for cutoff in [None] + [float(v) for v in args.cutoffs.split(',')]:
+            if label == 'full' and cutoff is None:
+                continue
+            t0 = time.perf_counter()
+            B = compute_field_timeseries(start, end, currents, sensors[idx], cutoff=cutoff)
+            seconds = time.perf_counter() - t0
+            err = np.linalg.norm(B - full[idx]) / np.linalg.norm(full[idx])
+            print(f"{label:<10} {'-' if cutoff is None else f'{cutoff:g}':>7} {idx.size:>6} {seconds:>9.3f} "
+                  f"{t_full / seconds:>8.2f} {err:>11.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Segment count, speed and error of the finite-segment kernel with adaptive coarsening.
+
+The reference is the exact finite-segment field of the full 200-point curves.
+
+Run from the backend directory:
+
+    python benchmarks/bench_segments.py --n-neurons 200 --sensor-res 32 --n-time 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulation.field import compute_field_timeseries  # noqa: E402
+from simulation.segments import coarsen_currents, coarsen_segments  # noqa: E402
+from bench_parallel import build_problem  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n-neurons', type=int, default=200)
+    parser.add_argument('--sensor-res', type=int, default=32)
+    parser.add_argument('--n-time', type=int, default=20)
+    parser.add_argument('--tols', default='0.5,1,2')
+    parser.add_argument('--max-ds', default='0.0125,0.025,0.05')
+    args = parser.parse_args()
+
+    table, currents, sensors = build_problem(args.n_neurons, args.sensor_res, args.n_time)
+    M = currents.shape[1]
+    print(f"sensors={sensors.shape[0]} segments={M} timesteps={currents.shape[0]}")
+
+    t0 = time.perf_counter()
+    exact = compute_field_timeseries(table['start'], table['end'], currents, sensors, kernel='segment')
+    t_exact = time.perf_counter() - t0
+
+    def report(label, segments, seconds, B):
+        l2 = np.linalg.norm(B - exact) / np.linalg.norm(exact)
+        print(f"{label:<22} {segments:>9} {M / segments:>7.1f} {seconds:>9.3f} {t_exact / seconds:>8.2f} {l2:>11.2e}")
+
+    print(f"{'variant':<22} {'segments':>9} {'fewer':>7} {'seconds':>9} {'speedup':>8} {'rel L2 err':>11}")
+    report('segment (reference)', M, t_exact, exact)
+    t0 = time.perf_counter()
+    midpoint = compute_field_timeseries(table['start'], table['end'], currents, sensors)
+    report('midpoint', M, time.perf_counter() - t0, midpoint)
+    for tol in (float(v) for v in args.tols.split(',')):
+        for max_ds in (float(v) for v in args.max_ds.split(',')):
+            t0 = time.perf_counter()
+            coarse = coarsen_segments(table, sensors, tol=tol, max_ds=max_ds)
+            coarse_currents = coarsen_currents(table, coarse, currents)
+            B = compute_field_timeseries(coarse['start'], coarse['end'], coarse_currents, sensors, kernel='segment')
+            report(f"tol={tol:g} max_ds={max_ds:g}", coarse['start'].shape[0], time.perf_counter() - t0, B)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark of sparse and stencil Laplacian graph smoothing against the per-node loop.
+
+Run from the backend directory:
+
+    python benchmarks/bench_smoothing.py --sensor-res 16 --n-time 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from denoiser import laplacian_smoothing, stencil_smoothing  # noqa: E402
+from graph import edge_adjacency, spatiotemporal_edges  # noqa: E402
+
+
+def loop_smoothing(df, source, target, weight, n_iters=3, alpha=0.1):
+    """The previous adjacency-list implementation, with node id t*N + i read as df[i, t]."""
+    N, T = df.shape
+    df_smooth = df.copy().astype(float)
+    adj = [[] for _ in range(N * T)]
+    for s, t_node, w in zip(source.tolist(), target.tolist(), weight.tolist()):
+        adj[s].append((t_node, w))
+        adj[t_node].append((s, w))
+    for _ in range(n_iters):
+        df_new = df_smooth.copy()
+        for node_idx, neighbors in enumerate(adj):
+            if not neighbors:
+                continue
+            t_idx, i = divmod(node_idx, N)
+            neighbor_sum = 0.0
+            neighbor_weight_sum = 0.0
+            for neighbor_idx, edge_weight in neighbors:
+                nt, ni = divmod(neighbor_idx, N)
+                neighbor_sum += df_smooth[ni, nt] * edge_weight
+                neighbor_weight_sum += edge_weight
+            df_new[i, t_idx] = (1 - alpha) * df_smooth[i, t_idx] + alpha * neighbor_sum / neighbor_weight_sum
+        df_smooth = df_new
+    return df_smooth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensor-res', type=int, default=16)
+    parser.add_argument('--n-time', type=int, default=20)
+    parser.add_argument('--spatial-threshold', type=float, default=0.15)
+    parser.add_argument('--temporal-threshold', type=int, default=1)
+    parser.add_argument('--n-iters', type=int, default=3)
+    parser.add_argument('--alpha', type=float, default=0.1)
+    parser.add_argument('--skip-loop', action='store_true', help='time only the sparse engine')
+    args = parser.parse_args()
+
+    xs = np.linspace(0.0, 1.0, args.sensor_res)
+    N, T = xs.size ** 2, args.n_time
+    df = np.random.default_rng(0).normal(size=(N, T))
+    coo = spatiotemporal_edges(xs, xs, N, T, args.spatial_threshold, args.temporal_threshold)
+    print(f"nodes={N * T} edges={coo['source'].size}")
+
+    t0 = time.perf_counter()
+    adj = edge_adjacency(coo['source'], coo['target'], coo['weight'], N * T)
+    t_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    fast = laplacian_smoothing(df, adj, n_iters=args.n_iters, alpha=args.alpha)
+    t_sparse = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    stencil = stencil_smoothing(df, xs, xs, n_iters=args.n_iters, alpha=args.alpha,
+                                spatial_threshold=args.spatial_threshold,
+                                temporal_threshold=args.temporal_threshold)
+    t_stencil = time.perf_counter() - t0
+    print(f"{'engine':<8} {'seconds':>9} {'speedup':>8} {'max |diff|':>11}")
+    if args.skip_loop:
+        print(f"{'sparse':<8} {t_build + t_sparse:9.4f}")
+        print(f"{'stencil':<8} {t_stencil:9.4f} {'':8} {np.abs(stencil - fast).max():11.2e}")
+        return
+    t0 = time.perf_counter()
+    slow = loop_smoothing(df, coo['source'], coo['target'], coo['weight'], args.n_iters, args.alpha)
+    t_loop = time.perf_counter() - t0
+    print(f"{'loop':<8} {t_loop:9.4f} {1.0:8.1f}")
+    print(f"{'sparse':<8} {t_build + t_sparse:9.4f} {t_loop / (t_build + t_sparse):8.1f} "
+          f"{np.abs(fast - slow).max():11.2e}")
+    print(f"{'stencil':<8} {t_stencil:9.4f} {t_loop / t_stencil:8.1f} {np.abs(stencil - slow).max():11.2e}")
+
+
+if __name__ == '__main__':
+    main()
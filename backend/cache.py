@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 512 * 1024 ** 2
+DEFAULT_DISK_BYTES = 4 * 1024 ** 3
+
+
+def _flatten(result, prefix=''):
+    """dict of arrays / nested dicts of arrays -> flat {'a', 'table.start', ...}."""
+    flat = {}
+    for name, value in result.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + name + '.'))
+        else:
+            flat[prefix + name] = np.asarray(value)
+    return flat
+
+
+def _entry_bytes(path):
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    except FileNotFoundError:
+        return 0
+
+
+def _unflatten(flat):
+    result = {}
+    for name, value in flat.items():
+        *parents, leaf = name.split('.')
+        node = result
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = value
+    return result
+
+
+class StageCache:
+    """Content-addressed cache of pipeline stage results.
+
+    Entries are keyed by a hash of the stage name and the request parameters
+    that stage depends on, so sweeping a downstream parameter (noise, filter
+    widths) reuses the upstream arrays. An in-memory LRU tier is bounded by
+    max_bytes; when disk_dir is set, entries are also written there as .npy
+    files and served memory-mapped after they drop out of memory. The disk
+    tier is an LRU bounded by max_disk_bytes as well: entries already in
+    disk_dir are picked up (oldest modified first) and the least recently
+    used ones are deleted to make room. Arrays still memory-mapped from a
+    deleted entry stay readable.
+
+    Cached arrays are read-only; stages must not modify results in place.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, disk_dir=None, max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._entries = OrderedDict()  # key -> (stage, flat arrays, nbytes)
+        self._nbytes = 0
+        self._disk = OrderedDict()  # key -> bytes on disk, least recently used first
+        self._disk_nbytes = 0
+        self._disk_evictions = 0
+        self._lock = threading.Lock()
+        self._stats = {}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            existing = [entry for entry in os.scandir(disk_dir) if entry.is_dir() and not entry.name.startswith('.')]
+            for entry in sorted(existing, key=lambda entry: entry.stat().st_mtime):
+                self._disk[entry.name] = _entry_bytes(entry.path)
+                self._disk_nbytes += self._disk[entry.name]
+            self._evict_disk()
+
+    @staticmethod
+    def key(stage, params):
+        blob = json.dumps({'stage': stage, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def _count(self, stage, counter):
+        stats = self._stats.setdefault(stage, {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0})
+        stats[counter] += 1
+
+    def get(self, stage, params):
+        """Cached result dict for (stage, params), or None."""
+        key = self.key(stage, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._count(stage, 'hits')
+                return _unflatten(entry[1])
+        flat = self._load(key)
+        with self._lock:
+            self._count(stage, 'disk_hits' if flat is not None else 'misses')
+        return _unflatten(flat) if flat is not None else None
+
+    def put(self, stage, params, result):
+        """Store the arrays of result (nested dicts allowed) for (stage, params)."""
+        key = self.key(stage, params)
+        flat = _flatten(result)
+        for arr in flat.values():
+            arr.flags.writeable = False
+        nbytes = sum(arr.nbytes for arr in flat.values())
+        if self.disk_dir:
+            self._store(key, flat)
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[2]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (stage, flat, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, (old_stage, _, old_bytes) = self._entries.popitem(last=False)
+                self._nbytes -= old_bytes
+                self._count(old_stage, 'evictions')
+
+    def get_or_compute(self, stage, params, compute):
+        """Return the cached result, or call compute() and cache what it returns."""
+        result = self.get(stage, params)
+        if result is None:
+            result = compute()
+            self.put(stage, params, result)
+        return result
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _touch_disk(self, key):
+        """Mark a disk entry as most recently used, adding entries written by other processes."""
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                return
+        nbytes = _entry_bytes(self._path(key))
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = nbytes
+                self._disk_nbytes += nbytes
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used disk entries until the tier fits max_disk_bytes."""
+        victims = []
+        with self._lock:
+            while self._disk_nbytes > self.max_disk_bytes and self._disk:
+                key, nbytes = self._disk.popitem(last=False)
+                self._disk_nbytes -= nbytes
+                self._disk_evictions += 1
+                victims.append(key)
+        for key in victims:
+            shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def _store(self, key, flat):
+        path = self._path(key)
+        if os.path.isdir(path):
+            self._touch_disk(key)
+            return
+        if sum(arr.nbytes for arr in flat.values()) > self.max_disk_bytes:
+            return
+        # write into a temporary directory and rename, so readers never see partial entries
+        tmp = tempfile.mkdtemp(dir=self.disk_dir, prefix='.tmp-')
+        for name, arr in flat.items():
+            np.save(os.path.join(tmp, name + '.npy'), arr)
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._touch_disk(key)
+
+    def _load(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            names = os.listdir(path)
+            flat = {name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r')
+                    for name in names if name.endswith('.npy')}
+        except FileNotFoundError:
+            # evicted (or never written) in the meantime
+            return None
+        self._touch_disk(key)
+        return flat
+
+    def stats(self):
+        """Hit/miss counters per stage plus memory- and disk-tier occupancy."""
+        with self._lock:
+            return {
+                'stages': {stage: dict(counters) for stage, counters in self._stats.items()},
+                'entries': len(self._entries),
+                'bytes': self._nbytes,
+                'max_bytes': self.max_bytes,
+                'disk_dir': self.disk_dir,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_nbytes,
+                'max_disk_bytes': self.max_disk_bytes,
+                'disk_evictions': self._disk_evictions,
+            }
+
+    def clear(self):
+        """Drop the memory tier and reset counters (the disk tier is left alone)."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._stats.clear()
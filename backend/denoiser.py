@@ -1,5 +1,9 @@
 import numpy as np
-from scipy.ndimage import gaussian_filter
+from scipy.ndimage import gaussian_filter, gaussian_filter1d
+from scipy.signal import lfilter, lfilter_zi
+from scipy.sparse import diags
+
+from graph import edge_adjacency
 
 def denoise_frequency_shift(df_noisy, spatial_sigma=1.0, temporal_sigma=1.0):
     """
@@ -7,12 +11,182 @@ def denoise_frequency_shift(df_noisy, spatial_sigma=1.0, temporal_sigma=1.0):
     Simple proxy for GCNN denoising (full GCNN would use PyTorch+PyG).
     - df_noisy: (N_sensors, T) array
     - spatial_sigma, temporal_sigma: Gaussian filter std
-    Returns denoised df same shape
+    Returns denoised df same shape (float32 for float32 input, else float64)
     """
     # Apply 2D Gaussian filtering (spatial + temporal)
-    df_denoised = gaussian_filter(df_noisy.astype(float), sigma=(spatial_sigma, temporal_sigma))
+    dtype = np.result_type(df_noisy.dtype, np.float32)
+    df_denoised = gaussian_filter(df_noisy.astype(dtype), sigma=(spatial_sigma, temporal_sigma))
     return df_denoised
 
+# kernel radius (in sigmas) beyond which the Gaussian tail is below double precision
+EXACT_TRUNCATE = 8.5
+
+
+def _recursive_gaussian_coeffs(sigma):
+    """Young & van Vliet (1995) third-order recursive Gaussian: lfilter (b, a)."""
+    if sigma >= 2.5:
+        q = 0.98711 * sigma - 0.96330
+    else:
+        q = 3.97156 - 4.14554 * np.sqrt(1 - 0.26891 * sigma)
+    b0 = 1.57825 + 2.44413 * q + 1.4281 * q**2 + 0.422205 * q**3
+    b1 = 2.44413 * q + 2.85619 * q**2 + 1.26661 * q**3
+    b2 = -(1.4281 * q**2 + 1.26661 * q**3)
+    b3 = 0.422205 * q**3
+    B = 1 - (b1 + b2 + b3) / b0
+    return np.array([B]), np.array([1.0, -b1 / b0, -b2 / b0, -b3 / b0])
+
+
+# scipy.ndimage boundary modes -> np.pad modes
+_PAD_MODES = {'reflect': 'symmetric', 'mirror': 'reflect', 'nearest': 'edge', 'wrap': 'wrap', 'constant': 'constant'}
+
+
+def _smooth_axis(grid, sigma, axis, method, truncate, mode):
+    """Gaussian-smooth grid in place along one axis."""
+    if sigma <= 0 or grid.shape[axis] < 2:
+        return
+    # below a few sigma the truncated kernel is as cheap as the recursion and more accurate
+    if method == 'iir' and sigma >= 3:
+        # pad by the boundary mode, then a causal and an anti-causal pass over each line
+        b, a = (c.astype(grid.dtype) for c in _recursive_gaussian_coeffs(sigma))
+        zi = lfilter_zi(b, a).astype(grid.dtype)
+        line = np.moveaxis(grid, axis, -1)
+        pad = int(np.ceil(4 * sigma))
+        y = np.pad(line, [(0, 0)] * (line.ndim - 1) + [(pad, pad)], mode=_PAD_MODES[mode])
+        y, _ = lfilter(b, a, y, axis=-1, zi=zi * y[..., :1])
+        y = y[..., ::-1]
+        y, _ = lfilter(b, a, y, axis=-1, zi=zi * y[..., :1])
+        line[...] = y[..., ::-1][..., pad:pad + line.shape[-1]]
+        return
+    radius = EXACT_TRUNCATE if method in ('exact', 'iir') else truncate
+    gaussian_filter1d(grid, sigma, axis=axis, output=grid, mode=mode, truncate=radius)
+
+
+def gaussian_denoise(df_noisy, grid_shape, spatial_sigma=1.0, temporal_sigma=1.0, method='fir',
+                     truncate=4.0, mode='reflect', dtype=None, out=None):
+    """
+    Separable Gaussian denoising on the (rows, cols, T) sensor grid.
+    Unlike denoise_frequency_shift, the two spatial axes are filtered
+    separately, so the blur does not wrap across grid rows.
+    - df_noisy: (N_sensors, T) array, sensor i at grid position (i // cols, i % cols)
+    - grid_shape: (rows, cols) with rows * cols == N_sensors
+    - spatial_sigma, temporal_sigma: Gaussian std in grid steps and timesteps
+    - method: 'exact' (kernel to EXACT_TRUNCATE sigmas), 'fir' (truncated at
+      `truncate` sigmas, cost O(sigma) per sample) or 'iir' (recursive
+      Young-van Vliet filter for sigma >= 3, O(1) per sample for any sigma,
+      a few % kernel error; narrower axes use the exact kernel)
+    - mode: boundary handling, as in scipy.ndimage
+    - dtype: computation dtype (float32 or float64); defaults to out's dtype,
+      else float32 for float32 input and float64 otherwise
+    - out: optional C-contiguous (N_sensors, T) array for the result; may be df_noisy itself
+    Returns the denoised array (out if given)
+    """
+    N, T = df_noisy.shape
+    rows, cols = grid_shape
+    if rows * cols != N:
+        raise ValueError(f"grid {rows}x{cols} does not hold {N} sensors")
+    if dtype is None:
+        dtype = out.dtype if out is not None else np.result_type(df_noisy.dtype, np.float32)
+    dtype = np.dtype(dtype)
+    if out is None:
+        out = np.array(df_noisy, dtype=dtype)
+    else:
+        if out.dtype != dtype or out.shape != (N, T) or not out.flags.c_contiguous:
+            raise ValueError(f"out must be a C-contiguous {dtype} array of shape {(N, T)}")
+        if out is not df_noisy:
+            np.copyto(out, df_noisy)
+    grid = out.reshape((rows, cols, T))
+    for axis, sigma in ((0, spatial_sigma), (1, spatial_sigma), (2, temporal_sigma)):
+        _smooth_axis(grid, sigma, axis, method, truncate, mode)
+    return out
+
+
+class OnlineDenoiser:
+    """
+    Frame-by-frame Gaussian denoising for continuous acquisition.
+    Each incoming frame is filtered spatially on the sensor grid and kept in a
+    ring buffer of the last radius + lag + 1 frames; frame t is emitted once
+    frame t + lag has arrived, as the temporal Gaussian over frames
+    t - radius .. t + lag. lag=0 is causal (half kernel, no latency);
+    lag=radius gives the full kernel and, away from the start of the
+    recording, the same output as gaussian_denoise(method='fir').
+    Memory is O(grid x (radius + lag)), independent of the recording length.
+    - grid_shape: (rows, cols), sensor i at (i // cols, i % cols)
+    - spatial_sigma, temporal_sigma: Gaussian std in grid steps and frames
+    - lag: frames of latency; None for the full kernel (lag = radius)
+    - truncate: kernel radius in sigmas, radius = int(truncate * temporal_sigma + 0.5)
+    - dtype: computation and output dtype
+    """
+
+    def __init__(self, grid_shape, spatial_sigma=1.0, temporal_sigma=1.0, lag=None, truncate=4.0,
+                 mode='reflect', dtype=np.float32):
+        self.grid_shape = tuple(grid_shape)
+        self.spatial_sigma = spatial_sigma
+        self.truncate = truncate
+        self.mode = mode
+        self.dtype = np.dtype(dtype)
+        self.radius = int(truncate * temporal_sigma + 0.5) if temporal_sigma > 0 else 0
+        self.lag = self.radius if lag is None else min(int(lag), self.radius)
+        offsets = np.arange(-self.radius, self.lag + 1)
+        self._weights = (np.exp(-0.5 * (offsets / temporal_sigma) ** 2) if temporal_sigma > 0
+                         else np.ones(1)).astype(self.dtype)
+        self._ring = np.zeros((self.radius + self.lag + 1, *self.grid_shape), dtype=self.dtype)
+        self.reset()
+
+    def reset(self):
+        """Forget all buffered frames and start a new recording."""
+        self._received = 0
+        self._emitted = 0
+
+    @property
+    def pending(self):
+        """Frames received but not yet emitted."""
+        return self._received - self._emitted
+
+    def _emit(self, t):
+        # taps that exist: no frames before 0, none after the last one received
+        lo = max(0, t - self.radius)
+        hi = min(self._received - 1, t + self.lag)
+        w = self._weights[lo - t + self.radius:hi - t + self.radius + 1]
+        frames = self._ring[np.arange(lo, hi + 1) % self._ring.shape[0]]
+        out = np.tensordot(w / w.sum(), frames, axes=1)
+        return out.reshape(-1)
+
+    def push(self, frames):
+        """
+        Add frames and return the ones that are ready.
+        - frames: (N_sensors,) single frame or (N_sensors, k) chunk, time along axis 1
+        Returns (N_sensors, m) denoised frames, m >= 0, in time order
+        """
+        frames = np.asarray(frames, dtype=self.dtype)
+        if frames.ndim == 1:
+            frames = frames[:, None]
+        rows, cols = self.grid_shape
+        grid = np.ascontiguousarray(frames.reshape((rows, cols, -1)))
+        for axis in (0, 1):
+            _smooth_axis(grid, self.spatial_sigma, axis, 'fir', self.truncate, self.mode)
+        ready = []
+        for k in range(grid.shape[2]):
+            self._ring[self._received % self._ring.shape[0]] = grid[:, :, k]
+            self._received += 1
+            if self._received - self._emitted > self.lag:
+                ready.append(self._emit(self._emitted))
+                self._emitted += 1
+        return self._stack(ready)
+
+    def flush(self):
+        """Emit the last `lag` frames with the kernel cut at the end of the recording."""
+        ready = []
+        while self._emitted < self._received:
+            ready.append(self._emit(self._emitted))
+            self._emitted += 1
+        return self._stack(ready)
+
+    def _stack(self, ready):
+        if not ready:
+            return np.zeros((self.grid_shape[0] * self.grid_shape[1], 0), dtype=self.dtype)
+        return np.stack(ready, axis=1)
+
+
 def graph_smoothing(df, nodes, edges, n_iters=3, alpha=0.1):
     """
     Smooth frequency shifts using graph structure (simple Laplacian smoothing).
@@ -25,41 +199,124 @@ def graph_smoothing(df, nodes, edges, n_iters=3, alpha=0.1):
     Returns smoothed df
     """
     N, T = df.shape
-    df_smooth = df.copy().astype(float)
-    
-    # Build adjacency for fast lookup
-    adj = [[] for _ in range(len(nodes))]
-    for edge in edges:
-        s, t_node = edge['source'], edge['target']
-        if s < len(adj) and t_node < len(adj):
-            w = edge['weight']
-            adj[s].append((t_node, w))
-            adj[t_node].append((s, w))
-    
-    # Laplacian smoothing: iteratively average node features with neighbors
-    for iteration in range(n_iters):
-        df_new = df_smooth.copy()
-        for node_idx, neighbors in enumerate(adj):
-            if node_idx >= len(nodes) or not neighbors:
-                continue
-            t_idx = nodes[node_idx]['time_idx']
-            if t_idx >= T:
+    source = np.array([edge['source'] for edge in edges], dtype=np.int64)
+    target = np.array([edge['target'] for edge in edges], dtype=np.int64)
+    weight = np.array([edge['weight'] for edge in edges], dtype=float)
+    adj = edge_adjacency(source, target, weight, N * T)
+    return laplacian_smoothing(df, adj, n_iters=n_iters, alpha=alpha)
+
+
+def laplacian_smoothing(df, adjacency, n_iters=3, alpha=0.1):
+    """
+    Laplacian smoothing of every (sensor, time) value with one sparse mat-vec per iteration.
+    - df: (N, T) frequency shift array
+    - adjacency: (N*T, N*T) scipy.sparse weighted adjacency over node ids
+      t_idx * N + sensor, as built by graph.edge_adjacency / graph_adjacency
+    - n_iters: number of smoothing iterations
+    - alpha: smoothing strength; each value moves alpha of the way towards the
+      weighted mean of its neighbours (isolated nodes are left unchanged)
+    Returns smoothed df (N, T), float32 for float32 input and float64 otherwise
+    """
+    N, T = df.shape
+    dtype = np.result_type(df.dtype, np.float32)
+    adjacency = adjacency.tocsr()
+    deg = np.asarray(adjacency.sum(axis=1)).ravel()
+    connected = deg > 0
+    # row-normalised operator, built once: (P v)_k = weighted neighbour mean of node k
+    inv_deg = np.zeros_like(deg, dtype=float)
+    inv_deg[connected] = 1.0 / deg[connected]
+    P = (diags(inv_deg) @ adjacency).astype(dtype)
+    step = (alpha * connected).astype(dtype)
+
+    v = df.T.astype(dtype).ravel()
+    for _ in range(n_iters):
+        v = v + step * (P @ v - v)
+    return np.ascontiguousarray(v.reshape((T, N)).T)
+
+
+def _spatial_stencil(xs, ys, spatial_threshold):
+    """
+    Neighbour offsets of a sensor grid and their per-position edge weights.
+    - xs: (na,) coordinate along grid axis 0, ys: (nb,) along axis 1
+    - Returns: list of (da, db, w) with w (na-|da|, nb-|db|) the weight
+      1/(dist+0.01) of each pair (a, b) -> (a+da, b+db), 0 where dist >= threshold.
+      The (0, 0) offset is left out.
+    """
+    na, nb = len(xs), len(ys)
+
+    def axis_offsets(coords, n):
+        # offsets for which some pair along this axis is closer than the threshold
+        found = []
+        for d in range(-(n - 1), n):
+            lo, hi = max(0, -d), n - max(0, d)
+            diff = coords[lo:hi] - coords[lo + d:hi + d]
+            if np.any(np.abs(diff) < spatial_threshold):
+                found.append((d, diff))
+        return found
+
+    stencil = []
+    for da, dx in axis_offsets(np.asarray(xs, dtype=float), na):
+        for db, dy in axis_offsets(np.asarray(ys, dtype=float), nb):
+            if da == 0 and db == 0:
                 continue
-            
-            # average over neighbors weighted by edge weight
-            neighbor_sum = 0.0
-            neighbor_weight_sum = 0.0
-            for neighbor_idx, edge_weight in neighbors:
-                if neighbor_idx < len(nodes):
-                    neighbor_t_idx = nodes[neighbor_idx]['time_idx']
-                    if neighbor_t_idx < T:
-                        neighbor_sum += df_smooth[neighbor_idx, neighbor_t_idx] * edge_weight
-                        neighbor_weight_sum += edge_weight
-            
-            if neighbor_weight_sum > 0:
-                neighbor_avg = neighbor_sum / neighbor_weight_sum
-                df_new[node_idx, t_idx] = (1 - alpha) * df_smooth[node_idx, t_idx] + alpha * neighbor_avg
-        
-        df_smooth = df_new
-    
-    return df_smooth
+            # same arithmetic as the explicit edge list, so the same pairs pass the threshold
+            dist = np.sqrt(dx[:, None]*dx[:, None] + dy[None, :]*dy[None, :])
+            close = dist < spatial_threshold
+            if close.any():
+                stencil.append((da, db, np.where(close, 1.0 / (dist + 0.01), 0.0)))
+    return stencil
+
+
+def stencil_smoothing(df, xs, ys, n_iters=3, alpha=0.1, spatial_threshold=0.15, temporal_threshold=1):
+    """
+    Matrix-free Laplacian smoothing on the sensor grid.
+    Applies the same weighted neighbour averaging as laplacian_smoothing on the
+    spatiotemporal graph (graph.spatiotemporal_edges), as shifted-array sums over
+    the (len(xs), len(ys), T) grid; memory is O(grid) rather than O(edges).
+    - df: (N, T) frequency shift array, sensor i at (xs[i // len(xs)], ys[i % len(xs)])
+    - xs, ys: sensor grid coordinates
+    - n_iters, alpha: as in laplacian_smoothing
+    - spatial_threshold, temporal_threshold: graph neighbourhood, as in build_spatiotemporal_graph
+    Returns smoothed df (N, T), float32 for float32 input and float64 otherwise
+    """
+    N, T = df.shape
+    nb = len(xs)
+    if N % nb:
+        raise ValueError(f"{N} sensors do not fill a grid with {nb} columns")
+    na = N // nb
+    dtype = np.result_type(df.dtype, np.float32)
+    # weights are computed in float64 (so the same pairs pass the threshold) and rounded once
+    stencil = [(da, db, w.astype(dtype))
+               for da, db, w in _spatial_stencil(np.asarray(xs)[:na], np.asarray(ys)[:nb], spatial_threshold)]
+    # the same sensor at another time is at distance 0
+    self_weight = 1.0 / 0.01 if spatial_threshold > 0 else 0.0
+    max_dt = min(int(np.floor(temporal_threshold)), T - 1) if temporal_threshold >= 0 else -1
+    decay = [float(np.exp(-dt)) for dt in range(max_dt + 1)]
+
+    def neighbour_sum(v):
+        if max_dt < 0:
+            return np.zeros_like(v)
+        # spatial neighbours within the frame
+        spatial = np.zeros_like(v)
+        for da, db, w in stencil:
+            a0, a1 = max(0, -da), na - max(0, da)
+            b0, b1 = max(0, -db), nb - max(0, db)
+            spatial[a0:a1, b0:b1] += w[:, :, None] * v[a0 + da:a1 + da, b0 + db:b1 + db]
+        total = spatial.copy()
+        # neighbours dt frames away: the spatial neighbours plus the sensor itself
+        shifted = spatial + self_weight * v
+        for dt in range(1, max_dt + 1):
+            total[:, :, :-dt] += decay[dt] * shifted[:, :, dt:]
+            total[:, :, dt:] += decay[dt] * shifted[:, :, :-dt]
+        return total
+
+    v = df.astype(dtype).reshape((na, nb, T))
+    deg = neighbour_sum(np.ones_like(v))
+    connected = deg > 0
+    inv_deg = np.zeros_like(deg)
+    inv_deg[connected] = 1.0 / deg[connected]
+    step = (alpha * connected).astype(dtype)
+
+    for _ in range(n_iters):
+        v = v + step * (neighbour_sum(v) * inv_deg - v)
+    return v.reshape((N, T))
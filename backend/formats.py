@@ -0,0 +1,142 @@
+import io
+import json
+import struct
+
+import numpy as np
+from fastapi import HTTPException, Response
+
+# response format name -> media type; JSON stays the default
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'raw': 'application/octet-stream',
+    'npy': 'application/x-npy',
+    'npz': 'application/x-npz',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+_FORMATS_BY_MEDIA_TYPE = {media: name for name, media in MEDIA_TYPES.items()}
+
+# binary payloads carry data arrays as little-endian float32, index arrays as int32
+WIRE_DTYPE = np.dtype('<f4')
+WIRE_INDEX_DTYPE = np.dtype('<i4')
+_ALIGN = 8
+
+
+def negotiate_format(request):
+    """Pick the response format from `?format=` or the Accept header.
+
+    request: starlette Request, or None for in-process calls (always JSON)
+    Raises HTTPException(406) for an explicit but unsupported format.
+    """
+    if request is None:
+        return 'json'
+    fmt = request.query_params.get('format')
+    if fmt is not None:
+        if fmt not in MEDIA_TYPES:
+            raise HTTPException(status_code=406, detail=f"Unsupported format {fmt!r}; "
+                                                        f"choose one of {sorted(MEDIA_TYPES)}")
+        return fmt
+    for item in request.headers.get('accept', '').split(','):
+        media = item.split(';')[0].strip().lower()
+        if media in _FORMATS_BY_MEDIA_TYPE:
+            return _FORMATS_BY_MEDIA_TYPE[media]
+    return 'json'
+
+
+def _wire_dtype(arr):
+    return WIRE_INDEX_DTYPE if np.asarray(arr).dtype.kind in 'iub' else WIRE_DTYPE
+
+
+def _header(arrays, meta):
+    """JSON header describing arrays (name, dtype, shape, offset) plus meta."""
+    entries = []
+    offset = 0
+    for name, arr in arrays.items():
+        dtype = _wire_dtype(arr)
+        entries.append({'name': name, 'dtype': dtype.str, 'shape': list(arr.shape),
+                        'offset': offset})
+        offset += -(-arr.size * dtype.itemsize // _ALIGN) * _ALIGN
+    return dict(meta, arrays=entries)
+
+
+def encode_raw(arrays, meta):
+    """Pack arrays into one frame: uint32 LE header length, JSON header, buffers.
+
+    The header is padded to a multiple of 8 bytes and every buffer starts at
+    header['arrays'][i]['offset'] bytes past the end of the padded header.
+    """
+    header = json.dumps(_header(arrays, meta), separators=(',', ':')).encode('utf-8')
+    header += b' ' * (-(len(header) + 4) % _ALIGN)
+    parts = [struct.pack('<I', len(header)), header]
+    for arr in arrays.values():
+        buf = np.ascontiguousarray(arr, dtype=_wire_dtype(arr)).tobytes()
+        parts.append(buf + b'\0' * (-len(buf) % _ALIGN))
+    return b''.join(parts)
+
+
+def decode_raw(payload):
+    """Inverse of encode_raw: returns (arrays dict, header dict)."""
+    (n,) = struct.unpack_from('<I', payload, 0)
+    header = json.loads(payload[4:4 + n])
+    base = 4 + n
+    arrays = {}
+    for entry in header['arrays']:
+        count = int(np.prod(entry['shape']))
+        arrays[entry['name']] = np.frombuffer(payload, dtype=entry['dtype'], count=count,
+                                              offset=base + entry['offset']).reshape(entry['shape'])
+    return arrays, header
+
+
+def _encode_npy(arrays, meta):
+    if len(arrays) != 1:
+        raise HTTPException(status_code=406, detail=".npy holds a single array; "
+                                                    f"this response has {sorted(arrays)}, use npz or raw")
+    buf = io.BytesIO()
+    arr = next(iter(arrays.values()))
+    np.save(buf, np.ascontiguousarray(arr, dtype=_wire_dtype(arr)))
+    return buf.getvalue(), {'X-Lucerna-Header': json.dumps(_header(arrays, meta), separators=(',', ':'))}
+
+
+def _encode_npz(arrays, meta):
+    buf = io.BytesIO()
+    payload = {name: np.asarray(arr, dtype=_wire_dtype(arr)) for name, arr in arrays.items()}
+    payload['header'] = np.array(json.dumps(_header(arrays, meta)))
+    np.savez(buf, **payload)
+    return buf.getvalue(), {}
+
+
+def _encode_arrow(arrays, meta):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=406, detail='Arrow output requires pyarrow on the server')
+    columns = [pa.array([np.asarray(arr, dtype=_wire_dtype(arr)).ravel()],
+                        type=pa.list_(pa.from_numpy_dtype(_wire_dtype(arr))))
+               for arr in arrays.values()]
+    schema_meta = {b'lucerna': json.dumps(_header(arrays, meta)).encode('utf-8')}
+    batch = pa.RecordBatch.from_arrays(columns, names=list(arrays))
+    batch = batch.replace_schema_metadata(schema_meta)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes(), {}
+
+
+def encode_response(fmt, arrays, meta, json_body):
+    """Serialize an endpoint result in the negotiated format.
+
+    fmt: name from negotiate_format
+    arrays: dict of name -> ndarray, the bulk data
+    meta: small JSON-able dict (shapes, coordinates) sent as the header
+    json_body: zero-argument callable building the default JSON response
+    """
+    if fmt == 'json':
+        return json_body()
+    if fmt == 'raw':
+        body, headers = encode_raw(arrays, meta), {}
+    elif fmt == 'npy':
+        body, headers = _encode_npy(arrays, meta)
+    elif fmt == 'npz':
+        body, headers = _encode_npz(arrays, meta)
+    else:
+        body, headers = _encode_arrow(arrays, meta)
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -1,4 +1,9 @@
 import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.spatial import cKDTree
+
+# columns of the node feature matrix, same order as the per-node 'features' list
+FEATURE_NAMES = ('freq', 'deriv', 'spatial_mean', 'time_idx', 'x', 'y')
 
 def build_spatiotemporal_graph(df, xs, ys, times, spatial_threshold=0.15, temporal_threshold=1):
     """
@@ -36,33 +41,169 @@ def build_spatiotemporal_graph(df, xs, ys, times, spatial_threshold=0.15, tempor
                 'time_idx': t_idx,
                 'x': float(x),
                 'y': float(y),
-                'features': [freq, deriv, spatial_mean, float(t_idx), x, y]
+                'features': [float(freq), float(deriv), float(spatial_mean), float(t_idx), float(x), float(y)]
             })
     
     # Edges: connect nearby nodes in space within same/adjacent time windows
-    edges = []
-    for n1 in nodes:
-        for n2 in nodes:
-            if n1['id'] >= n2['id']:
-                continue
-            
-            # spatial distance
-            dx = n1['x'] - n2['x']
-            dy = n1['y'] - n2['y']
-            spatial_dist = np.sqrt(dx*dx + dy*dy)
-            
-            # temporal distance
-            time_diff = abs(n1['time_idx'] - n2['time_idx'])
-            
-            # connect if spatially close AND temporally close
-            if spatial_dist < spatial_threshold and time_diff <= temporal_threshold:
-                weight = 1.0 / (spatial_dist + 0.01) * np.exp(-time_diff)
-                edges.append({
-                    'source': n1['id'],
-                    'target': n2['id'],
-                    'weight': float(weight),
-                    'spatial_dist': float(spatial_dist),
-                    'time_diff': int(time_diff)
-                })
+    coo = spatiotemporal_edges(xs, ys, N, T, spatial_threshold, temporal_threshold)
+    edges = [{
+        'source': int(s),
+        'target': int(t),
+        'weight': float(w),
+        'spatial_dist': float(d),
+        'time_diff': int(dt)
+    } for s, t, w, d, dt in zip(coo['source'], coo['target'], coo['weight'],
+                                coo['spatial_dist'], coo['time_diff'])]
     
     return nodes, edges
+
+
+def sensor_neighbors(xs, ys, n_sensors, spatial_threshold):
+    """
+    Ordered sensor pairs (i, j), i != j, closer than spatial_threshold.
+    - Sensor i sits at (xs[i // len(xs)], ys[i % len(xs)]), as in build_spatiotemporal_graph
+    - Candidates come from a KD-tree radius query and are re-checked with the
+      exact distance formula used for the edges
+    - Returns: i, j (int64) sorted by (i, j), and their distances
+    """
+    n_xy = len(xs)
+    idx = np.arange(n_sensors)
+    pos = np.stack([np.asarray(xs, dtype=float)[idx // n_xy],
+                    np.asarray(ys, dtype=float)[idx % n_xy]], axis=1)
+    if spatial_threshold <= 0 or n_sensors < 2:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    # slightly larger radius so the tree's own rounding cannot drop a boundary pair
+    pairs = cKDTree(pos).query_pairs(spatial_threshold * (1 + 1e-9) + 1e-300, output_type='ndarray')
+    i = np.concatenate([pairs[:, 0], pairs[:, 1]]).astype(np.int64)
+    j = np.concatenate([pairs[:, 1], pairs[:, 0]]).astype(np.int64)
+    dx = pos[i, 0] - pos[j, 0]
+    dy = pos[i, 1] - pos[j, 1]
+    dist = np.sqrt(dx*dx + dy*dy)
+    keep = dist < spatial_threshold
+    i, j, dist = i[keep], j[keep], dist[keep]
+    order = np.lexsort((j, i))
+    return i[order], j[order], dist[order]
+
+
+def spatiotemporal_edges(xs, ys, n_sensors, n_times, spatial_threshold=0.15, temporal_threshold=1):
+    """
+    Edges of the spatiotemporal graph as COO arrays, in O(V*k).
+    - Node id = t_idx * n_sensors + sensor index (the order of build_spatiotemporal_graph)
+    - An edge joins id1 < id2 when the sensors are closer than spatial_threshold
+      and |t1 - t2| <= temporal_threshold; the same sensor at different times counts
+    - Returns: dict of 'source', 'target' (int64), 'weight', 'spatial_dist'
+      (float64) and 'time_diff' (int64), sorted by (source, target)
+    """
+    N, T = n_sensors, n_times
+    i, j, dist = sensor_neighbors(xs, ys, N, spatial_threshold)
+    # same sensor at another time: distance 0, within any positive threshold
+    if spatial_threshold > 0:
+        self_idx = np.arange(N, dtype=np.int64)
+        i_all = np.concatenate([i, self_idx])
+        j_all = np.concatenate([j, self_idx])
+        dist_all = np.concatenate([dist, np.zeros(N)])
+    else:
+        i_all, j_all, dist_all = i, j, dist
+
+    blocks = []
+    max_dt = int(np.floor(temporal_threshold)) if temporal_threshold >= 0 else -1
+    for dt in range(0, min(max_dt, T - 1) + 1):
+        # within a frame only i < j gives id1 < id2; across frames every pair does
+        pi, pj, pd = (i, j, dist) if dt == 0 else (i_all, j_all, dist_all)
+        if dt == 0:
+            forward = pi < pj
+            pi, pj, pd = pi[forward], pj[forward], pd[forward]
+        t1 = np.arange(T - dt, dtype=np.int64)
+        source = (t1[:, None] * N + pi[None, :]).ravel()
+        target = ((t1[:, None] + dt) * N + pj[None, :]).ravel()
+        blocks.append((source, target, np.tile(pd, T - dt), dt))
+
+    if not blocks:
+        empty = np.zeros(0, dtype=np.int64)
+        return {'source': empty, 'target': empty, 'weight': np.zeros(0),
+                'spatial_dist': np.zeros(0), 'time_diff': empty}
+    source = np.concatenate([b[0] for b in blocks])
+    target = np.concatenate([b[1] for b in blocks])
+    spatial_dist = np.concatenate([b[2] for b in blocks])
+    time_diff = np.concatenate([np.full(b[0].size, b[3], dtype=np.int64) for b in blocks])
+    # np.exp evaluated per distinct time_diff, exactly as the scalar formula
+    decay = np.array([np.exp(-dt) for dt in range(len(blocks))])
+    weight = 1.0 / (spatial_dist + 0.01) * decay[time_diff]
+    order = np.lexsort((target, source))
+    return {
+        'source': source[order],
+        'target': target[order],
+        'weight': weight[order],
+        'spatial_dist': spatial_dist[order],
+        'time_diff': time_diff[order],
+    }
+
+
+def build_graph_arrays(df, xs, ys, times, spatial_threshold=0.15, temporal_threshold=1, csr=False):
+    """
+    Columnar form of build_spatiotemporal_graph: one array per attribute.
+    - Node id = t_idx * N_sensors + sensor index, as in build_spatiotemporal_graph
+    - csr: also include the symmetric adjacency as CSR arrays
+    - Returns: dict with
+      'features': (V, 6) float32, columns FEATURE_NAMES
+      'edge_index': (2, E) int32 source/target ids, source < target
+      'edge_weight', 'edge_dist': (E,) float32
+      'edge_time_diff': (E,) int32
+      'adj_indptr' (V+1,), 'adj_indices' (2E,) int32 and 'adj_weight' (2E,) float32 if csr
+    """
+    N, T = df.shape
+    n_xy = len(xs)
+    idx = np.arange(N)
+
+    # spatial mean over the sensor-index window [i - n_xy, i + n_xy), via prefix sums
+    lo = np.maximum(idx - n_xy, 0)
+    hi = np.minimum(idx + n_xy, N)
+    csum = np.zeros((N + 1, T))
+    np.cumsum(df, axis=0, out=csum[1:])
+    spatial_mean = (csum[hi] - csum[lo]) / (hi - lo)[:, None]
+
+    deriv = np.zeros_like(df, dtype=float)
+    deriv[:, 1:] = np.diff(df, axis=1)
+
+    features = np.empty((T, N, len(FEATURE_NAMES)), dtype=np.float32)
+    features[:, :, 0] = df.T
+    features[:, :, 1] = deriv.T
+    features[:, :, 2] = spatial_mean.T
+    features[:, :, 3] = np.arange(T)[:, None]
+    features[:, :, 4] = np.asarray(xs)[idx // n_xy]
+    features[:, :, 5] = np.asarray(ys)[idx % n_xy]
+
+    coo = spatiotemporal_edges(xs, ys, N, T, spatial_threshold, temporal_threshold)
+    graph = {
+        'features': features.reshape((N * T, len(FEATURE_NAMES))),
+        'edge_index': np.stack([coo['source'], coo['target']]).astype(np.int32),
+        'edge_weight': coo['weight'].astype(np.float32),
+        'edge_dist': coo['spatial_dist'].astype(np.float32),
+        'edge_time_diff': coo['time_diff'].astype(np.int32),
+    }
+    if csr:
+        adj = graph_adjacency(graph)
+        graph.update(adj_indptr=adj.indptr.astype(np.int32), adj_indices=adj.indices.astype(np.int32),
+                     adj_weight=adj.data)
+    return graph
+
+
+def graph_adjacency(graph):
+    """
+    Symmetric weighted adjacency of a build_graph_arrays graph.
+    - Returns: scipy.sparse csr_matrix (V, V), float32 edge weights
+    """
+    src, dst = graph['edge_index']
+    return edge_adjacency(src, dst, graph['edge_weight'], graph['features'].shape[0])
+
+
+def edge_adjacency(source, target, weight, n_nodes):
+    """
+    Symmetric weighted adjacency from COO edges (each undirected edge listed once).
+    - Returns: scipy.sparse csr_matrix (n_nodes, n_nodes) with the dtype of weight
+    """
+    adj = coo_matrix((np.concatenate([weight, weight]),
+                      (np.concatenate([source, target]), np.concatenate([target, source]))),
+                     shape=(n_nodes, n_nodes))
+    return adj.tocsr()
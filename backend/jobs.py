@@ -0,0 +1,172 @@
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_RESULT_BYTES = 1024 ** 3
+
+
+def result_nbytes(result):
+    """Approximate bytes held by a stage result.
+
+    Arrays count their buffers; nested dicts, lists and Python scalars (e.g.
+    the per-node dicts of a records-layout graph) count their object sizes.
+    """
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, dict):
+        return sys.getsizeof(result) + sum(result_nbytes(value) for value in result.values())
+    if isinstance(result, (list, tuple)):
+        return sys.getsizeof(result) + sum(result_nbytes(value) for value in result)
+    return sys.getsizeof(result)
+
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once cancellation is requested."""
+
+
+class JobLimitExceeded(Exception):
+    """Raised by JobManager.submit when the active-job limit is reached."""
+
+
+class Job:
+    """State of one background computation, updated from its worker thread."""
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'  # queued -> running -> done | failed | cancelled; done -> expired
+        self.done = 0
+        self.total = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.result_bytes = 0
+        self.error = None
+        self._cancel = threading.Event()
+
+    def report(self, done, total):
+        """Progress callback handed to the pipeline; raises once cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.done, self.total = done, total
+
+    def info(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': (self.done / self.total) if self.total else (1.0 if self.status == 'done' else 0.0),
+            'done': self.done,
+            'total': self.total,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error,
+            'result_bytes': self.result_bytes,
+            'cancel_requested': self._cancel.is_set(),
+        }
+
+
+class JobManager:
+    """Runs long pipeline calls on a bounded thread pool.
+
+    max_running jobs compute concurrently; at most max_active jobs may be
+    queued or running at once, so one client cannot pile up unbounded work.
+    Finished jobs are kept until max_finished newer ones have completed.
+    Their results together hold at most max_result_bytes: the oldest are
+    dropped first, and those jobs become 'expired'.
+    """
+
+    def __init__(self, max_running=2, max_active=8, max_finished=32, max_result_bytes=DEFAULT_RESULT_BYTES):
+        self.max_active = max_active
+        self.max_finished = max_finished
+        self.max_result_bytes = max_result_bytes
+        self._pool = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix='lucerna-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _active(self):
+        return sum(1 for job in self._jobs.values() if job.status in ('queued', 'running'))
+
+    def submit(self, kind, params, fn):
+        """Queue fn(progress) as a job and return it.
+
+        fn receives the job's progress callback and returns the job result.
+        """
+        job = Job(kind, params)
+        with self._lock:
+            if self._active() >= self.max_active:
+                raise JobLimitExceeded(f"{self.max_active} jobs already queued or running")
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        if job._cancel.is_set():
+            job.finished = time.time()
+            self._prune()
+            return
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            result = fn(job.report)
+            job.result, job.result_bytes = result, result_nbytes(result)
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception:
+            job.error = traceback.format_exc().strip().splitlines()[-1]
+            job.status = 'failed'
+            with open('backend_error.log', 'a', encoding='utf-8') as f:
+                f.write(f'\n--- JOB {job.id} ({job.kind}) ERROR ---\n')
+                f.write(traceback.format_exc())
+        finally:
+            job.finished = time.time()
+            self._prune()
+
+    def _prune(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items()
+                        if job.status not in ('queued', 'running')]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+            held = [job for job in self._jobs.values() if job.status == 'done']
+            total = sum(job.result_bytes for job in held)
+            for job in held:
+                if total <= self.max_result_bytes:
+                    break
+                total -= job.result_bytes
+                job.result = None
+                job.status = 'expired'
+                job.error = f'result dropped to stay within {self.max_result_bytes} bytes of job results'
+
+    @property
+    def result_bytes(self):
+        """Bytes held by the results of finished jobs."""
+        with self._lock:
+            return sum(job.result_bytes for job in self._jobs.values() if job.status == 'done')
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; running jobs stop at their next progress report."""
+        job = self.get(job_id)
+        if job is not None and job.status in ('queued', 'running'):
+            job._cancel.set()
+            if job.status == 'queued':
+                job.status = 'cancelled'
+        return job
+
+    def list(self):
+        with self._lock:
+            return [job.info() for job in self._jobs.values()]
@@ -23,28 +23,103 @@ def add_noise(df, noise_level=0.1, shot_noise=False, thermal_std=0.0, drift_std=
     - thermal_std: additive gaussian std (absolute)
     - drift_std: low-frequency drift standard deviation applied across time
     - rng: numpy random generator
-    Returns noisy df same shape as input
+    Returns noisy df same shape as input (float32 for float32 input, else float64)
     """
-    if rng is None:
-        rng = np.random.default_rng()
+    model = NoiseModel(df.shape, noise_level=noise_level, shot_noise=shot_noise,
+                       thermal_std=thermal_std, drift_std=drift_std,
+                       dtype=np.result_type(df.dtype, np.float32))
+    return model.apply(df, rng=rng)
 
-    df = df.astype(float)
-    maxv = max(1.0, np.max(np.abs(df)))
-    gauss_std = noise_level * maxv
-    noisy = df + rng.normal(scale=gauss_std, size=df.shape)
 
-    if shot_noise:
-        # approximate Poisson by adding sqrt-amplitude noise scaled to signal
-        shot = rng.normal(scale=np.sqrt(np.abs(df) + 1e-6))
-        noisy += shot * (noise_level * 0.5)
+class NoiseModel:
+    """
+    Noise model of add_noise with preallocated buffers.
+    The components are drawn in add_noise's order into two scratch buffers
+    and added to the output one at a time, so no full-size temporaries are
+    allocated per call; in float64 the result is bit-identical to add_noise
+    for the same generator state. float32 draws use numpy's float32
+    generator and therefore give different (equally distributed) noise.
+    - shape: (N_sensors, T) of the clean signal
+    - noise_level, shot_noise, thermal_std, drift_std: as in add_noise
+    - dtype: float64 or float32
+    """
+
+    def __init__(self, shape, noise_level=0.1, shot_noise=False, thermal_std=0.0, drift_std=0.0,
+                 dtype=np.float64):
+        self.shape = tuple(shape)
+        self.noise_level = noise_level
+        self.shot_noise = shot_noise
+        self.thermal_std = thermal_std
+        self.drift_std = drift_std
+        self.dtype = np.dtype(dtype)
+        self._draw = np.empty(self.shape, dtype=self.dtype)
+        self._shot_scale = np.empty(self.shape, dtype=self.dtype) if shot_noise else None
+        self._ramp = np.linspace(0.0, 1.0, self.shape[-1]).astype(self.dtype)
+
+    def _prepare(self, df):
+        """Signal-dependent scales, computed once per clean signal."""
+        maxv = max(1.0, float(np.max(np.abs(df))))
+        if self.shot_noise:
+            np.abs(df, out=self._shot_scale)
+            self._shot_scale += 1e-6
+            np.sqrt(self._shot_scale, out=self._shot_scale)
+        return self.noise_level * maxv
 
-    if thermal_std and thermal_std > 0.0:
-        noisy += rng.normal(scale=thermal_std, size=df.shape)
+    def _add(self, noisy, gauss_std, rng):
+        buf = self._draw
+        rng.standard_normal(out=buf, dtype=self.dtype)
+        buf *= gauss_std
+        noisy += buf
+        if self.shot_noise:
+            # approximate Poisson by adding sqrt-amplitude noise scaled to signal
+            rng.standard_normal(out=buf, dtype=self.dtype)
+            buf *= self._shot_scale
+            buf *= self.noise_level * 0.5
+            noisy += buf
+        if self.thermal_std and self.thermal_std > 0.0:
+            rng.standard_normal(out=buf, dtype=self.dtype)
+            buf *= self.thermal_std
+            noisy += buf
+        if self.drift_std and self.drift_std > 0.0:
+            # low-frequency drift: a small random walk per sensor across time
+            drift = rng.normal(scale=self.drift_std, size=(self.shape[0],)).astype(self.dtype)
+            np.multiply(drift[:, None], self._ramp[None, :], out=buf)
+            noisy += buf
+        return noisy
 
-    if drift_std and drift_std > 0.0:
-        # low-frequency drift: a small random walk per sensor across time
-        N, T = df.shape
-        drift = rng.normal(scale=drift_std, size=(N,))[:, None] * np.linspace(0.0, 1.0, T)[None, :]
-        noisy += drift
+    def apply(self, df, rng=None, out=None):
+        """
+        One noisy realization of df.
+        - out: optional (N_sensors, T) array of self.dtype for the result; may be df itself
+        Returns out (a new array if not given)
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        if df.shape != self.shape:
+            raise ValueError(f"expected shape {self.shape}, got {df.shape}")
+        gauss_std = self._prepare(df)
+        if out is None:
+            out = np.array(df, dtype=self.dtype)
+        elif out is not df:
+            np.copyto(out, df)
+        return self._add(out, gauss_std, rng)
 
-    return noisy
+    def ensemble(self, df, n_realizations, rng=None, out=None):
+        """
+        Many independent noisy realizations of the same clean signal.
+        Realization k equals the k-th of n_realizations successive apply calls
+        with the same generator.
+        - out: optional (n_realizations, N_sensors, T) array of self.dtype
+        Returns (n_realizations, N_sensors, T)
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        if df.shape != self.shape:
+            raise ValueError(f"expected shape {self.shape}, got {df.shape}")
+        if out is None:
+            out = np.empty((n_realizations, *self.shape), dtype=self.dtype)
+        gauss_std = self._prepare(df)
+        for k in range(n_realizations):
+            np.copyto(out[k], df)
+            self._add(out[k], gauss_std, rng)
+        return out
@@ -1,11 +1,17 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+import os
 import traceback
-from pydantic import BaseModel
-import numpy as np
-from simulation.neuron import generate_neuron_population
-from simulation.field import discretize_neuron_current, compute_biot_savart
-from odmr import field_to_frequency_shift, add_noise
+from typing import Literal
+from pydantic import BaseModel, ValidationError, model_validator
+from pipeline import (STAGE_CACHE, n_sensors, simulate_stage, odmr_stage, ensemble_stage, graph_stage, denoise_stage,
+                      sweep_stage, sweep_variants, check_sweep_grid)
+from formats import encode_raw, negotiate_format, encode_response
+from graph import FEATURE_NAMES
+from jobs import DEFAULT_RESULT_BYTES, JobManager, JobLimitExceeded
+from sessions import DEFAULT_FRAME_BYTES, DEFAULT_KERNEL_BYTES, SessionStore
+from streaming import FRAMES_MEDIA_TYPE, frame_messages, length_prefixed, progressive_messages, websocket_stream
 
 app = FastAPI(title="Lucerna Simulation API")
 
@@ -33,70 +39,121 @@ class SimRequest(BaseModel):
     t_max: float = 0.01
     sensor_res: int = 32
     rng_seed: int = 0
+    # 'kernel': linear superposition (one GEMM), 'direct': Biot-Savart per timestep,
+    # 'octree': approximate Barnes-Hut summation for large populations,
+    # 'fft': sensor-plane convolution per depth plane for large sensor grids
+    #   (default population: 3.7x faster at sensor_res=128, 4.8x at 256, ~0.2% error; see README)
+    engine: Literal['kernel', 'direct', 'octree', 'fft'] = 'kernel'
+    # octree opening angle; smaller is more accurate
+    theta: float = 0.3
+    # fft depth planes on each side of the sensor plane; more is more accurate
+    fft_slabs: int = 16
+    # 'midpoint': each segment is a current element at its midpoint; 'segment': exact straight-wire field
+    segment_kernel: Literal['midpoint', 'segment'] = 'midpoint'
+    # merge segments into chords of up to coarsen_tol x their distance to the sensors (0 = off),
+    # spanning at most coarsen_max_ds of the curve parameter (half the current pulse width)
+    coarsen_tol: float = 0.0
+    coarsen_max_ds: float = 0.025
+    # working precision of currents, kernel, B and everything downstream; geometry stays float64
+    dtype: Literal['float64', 'float32'] = 'float64'
+    # evaluate part of the sensors: every stride-th grid line, the grid points inside
+    # roi [xmin, xmax, ymin, ymax], or an explicit list of [x, y] / [x, y, z] sensors
+    roi: list[float] | None = None
+    stride: int = 1
+    sensors: list[list[float]] | None = None
+    # kernel engine: leave out segments farther than cutoff from a sensor (0 = off)
+    cutoff: float = 0.0
+    # parallel field evaluation: sensor blocks (kernel), timesteps (direct) or FFT threads (fft)
+    workers: int = 1
+    executor: Literal['thread', 'process'] = 'thread'
+
+    @model_validator(mode='after')
+    def _check_sensors(self):
+        if self.stride < 1:
+            raise ValueError('stride must be >= 1')
+        if self.roi is not None and len(self.roi) != 4:
+            raise ValueError('roi must be [xmin, xmax, ymin, ymax]')
+        if self.sensors is not None:
+            if any(len(p) not in (2, 3) for p in self.sensors):
+                raise ValueError('sensors must be a list of [x, y] or [x, y, z]')
+            if self.engine == 'fft':
+                raise ValueError("engine 'fft' needs a sensor grid; use roi or stride instead of sensors")
+        if self.cutoff < 0 or (self.cutoff > 0 and self.engine != 'kernel'):
+            raise ValueError("cutoff must be >= 0 and is only supported by engine 'kernel'")
+        if n_sensors(self) == 0:
+            raise ValueError('the sensor selection is empty')
+        return self
+
+
+def _full_grid_only(req):
+    # graph and denoising stages work on the (strided) sensor grid
+    if req.roi is not None or req.sensors is not None:
+        raise ValueError('this stage needs the full sensor grid; use stride to thin it instead of roi/sensors')
+    return req
+
+
+def _coords(result):
+    return {'xs': result['xs'].tolist(), 'ys': result['ys'].tolist(), 'times': result['times'].tolist()}
+
+
+def simulate_response(fmt, result, extra=None):
+    Btime = result['Btime']
+    meta = dict(_coords(result), Bshape=Btime.shape, **(extra or {}))
+    # return compact JSON: grid shape, xs, ys, times, and B flattened
+    return encode_response(fmt, {'B': Btime}, meta, lambda: {
+        **meta,
+        'B': Btime.reshape((-1,3)).tolist()  # (N*n_time,3) - consumer will reshape
+    })
+
+
+def odmr_response(fmt, result):
+    df_clean, df_noisy = result['df_clean'], result['df_noisy']
+    meta = dict(_coords(result), df_shape=df_clean.shape)
+    return encode_response(fmt, {'df_clean': df_clean, 'df_noisy': df_noisy}, meta, lambda: {
+        **meta,
+        'df_clean': df_clean.tolist(),
+        'df_noisy': df_noisy.tolist()
+    })
+
+
+def graph_response(fmt, result):
+    if 'graph' in result:
+        graph = result['graph']
+        meta = dict(_coords(result), feature_names=list(FEATURE_NAMES),
+                    n_nodes=int(graph['features'].shape[0]), n_edges=int(graph['edge_index'].shape[1]))
+        return encode_response(fmt, graph, meta, lambda: {
+            **meta,
+            **{name: arr.tolist() for name, arr in graph.items()}
+        })
+    if fmt != 'json':
+        raise HTTPException(status_code=406, detail="Binary graph formats need layout='columnar'")
+    nodes, edges = result['nodes'], result['edges']
+    return {
+        'nodes': nodes,
+        'edges': edges,
+        'n_nodes': len(nodes),
+        'n_edges': len(edges)
+    }
+
+
+def denoise_response(fmt, result):
+    df_noisy, df_denoised = result['df_noisy'], result['df_denoised']
+    meta = dict(_coords(result), df_shape=df_denoised.shape)
+    return encode_response(fmt, {'df_noisy': df_noisy, 'df_denoised': df_denoised}, meta, lambda: {
+        **meta,
+        'df_noisy': df_noisy.tolist(),
+        'df_denoised': df_denoised.tolist()
+    })
 
 
 @app.post("/simulate")
-def simulate(req: SimRequest):
+def simulate(req: SimRequest, request: Request):
+    # JSON by default; ?format= or Accept selects raw/npy/npz/arrow
+    fmt = negotiate_format(request)
     try:
-        rng = np.random.default_rng(req.rng_seed)
-        neurons = generate_neuron_population(n_neurons=req.n_neurons,
-                                             area=tuple(req.area),
-                                             z_range=tuple(req.z_range),
-                                             mean_length=req.mean_length,
-                                             rng=rng)
-
-        # build sensor grid in XY at z=0 (NV layer)
-        xmin,xmax,ymin,ymax = req.area
-        xs = np.linspace(xmin, xmax, req.sensor_res)
-        ys = np.linspace(ymin, ymax, req.sensor_res)
-        XX,YY = np.meshgrid(xs, ys)
-        sensor_points = np.stack([XX.ravel(), YY.ravel(), np.zeros_like(XX).ravel()], axis=1)
-
-        n_time = req.n_time
-        times = np.linspace(0, req.t_max, n_time)
-
-        # placeholder B-field array (N_sensors, n_time, 3)
-        N = sensor_points.shape[0]
-        Btime = np.zeros((N, n_time, 3), dtype=float)
-
-        # For each time, sum contributions from all neurons
-        for ti, t in enumerate(times):
-            segments_all_s = []
-            segments_all_e = []
-            currents_all = []
-            for neuron in neurons:
-                pts = neuron['pts']
-                tang = neuron['tangents']
-                L = pts.shape[0]
-                # define waveform along neuron: moving Gaussian pulse
-                # param s in [0,1] across curve
-                s = np.linspace(0.0, 1.0, L)
-                # pulse center moves with velocity v (units curve per second). choose v proportional to length
-                v = 0.5  # curve-units / second (adjustable)
-                # convert time to center position
-                center = (t * v) % 1.0
-                sigma = 0.05
-                waveform = np.exp(-0.5 * ((s - center) ** 2) / (sigma ** 2))
-                s0, s1, currents = discretize_neuron_current(pts, tang, waveform, current_amplitude=1.0)
-                segments_all_s.append(s0)
-                segments_all_e.append(s1)
-                currents_all.append(currents)
-            # concatenate
-            seg_s = np.concatenate(segments_all_s, axis=0)
-            seg_e = np.concatenate(segments_all_e, axis=0)
-            cur = np.concatenate(currents_all, axis=0)
-            # compute B
-            B = compute_biot_savart(seg_s, seg_e, cur, sensor_points)
-            Btime[:, ti, :] = B
-
-        # return compact JSON: grid shape, xs, ys, times, and B flattened
-        return {
-            'xs': xs.tolist(),
-            'ys': ys.tolist(),
-            'times': times.tolist(),
-            'Bshape': Btime.shape,
-            'B': Btime.reshape((-1,3)).tolist()  # (N*n_time,3) - consumer will reshape
-        }
+        return simulate_response(fmt, simulate_stage(req))
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         with open('backend_error.log', 'a', encoding='utf-8') as f:
@@ -106,6 +163,16 @@ def simulate(req: SimRequest):
 
 
 
+def ensemble_response(fmt, result):
+    df_ensemble = result['df_ensemble']
+    meta = dict(_coords(result), df_shape=df_ensemble.shape)
+    return encode_response(fmt, {'df_clean': result['df_clean'], 'df_ensemble': df_ensemble}, meta, lambda: {
+        **meta,
+        'df_clean': result['df_clean'].tolist(),
+        'df_ensemble': df_ensemble.tolist()
+    })
+
+
 class OdmrRequest(SimRequest):
     noise_level: float = 0.1
     signal_scale: float = 1.0
@@ -115,28 +182,12 @@ class OdmrRequest(SimRequest):
 
 
 @app.post("/odmr")
-def odmr(req: OdmrRequest):
+def odmr(req: OdmrRequest, request: Request):
+    fmt = negotiate_format(request)
     try:
-        # reuse simulation to produce B-time series
-        sim = simulate(req)
-        Bflat = np.array(sim['B'])
-        Bshape = tuple(sim['Bshape'])
-        Btime = Bflat.reshape(Bshape)
-
-        # compute proxy frequency shift and add noise
-        df_clean = field_to_frequency_shift(Btime, signal_scale=req.signal_scale)
-        rng = np.random.default_rng(req.rng_seed)
-        df_noisy = add_noise(df_clean, noise_level=req.noise_level, shot_noise=req.shot_noise,
-                             thermal_std=req.thermal_std, drift_std=req.drift_std, rng=rng)
-
-        return {
-            'xs': sim['xs'],
-            'ys': sim['ys'],
-            'times': sim['times'],
-            'df_shape': df_clean.shape,
-            'df_clean': df_clean.tolist(),
-            'df_noisy': df_noisy.tolist()
-        }
+        return odmr_response(fmt, odmr_stage(req))
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         with open('backend_error.log', 'a', encoding='utf-8') as f:
@@ -145,35 +196,47 @@ def odmr(req: OdmrRequest):
         raise HTTPException(status_code=500, detail='ODMR processing failed; logged backend_error.log')
 
 
+class EnsembleRequest(OdmrRequest):
+    n_realizations: int = 16
+
+
+@app.post("/odmr/ensemble")
+def odmr_ensemble(req: EnsembleRequest, request: Request):
+    """Monte-Carlo noise ensemble: many noisy realizations of one clean ODMR signal."""
+    fmt = negotiate_format(request)
+    try:
+        return ensemble_response(fmt, ensemble_stage(req))
+    except HTTPException:
+        raise
+    except Exception as e:
+        tb = traceback.format_exc()
+        with open('backend_error.log', 'a', encoding='utf-8') as f:
+            f.write('\n--- ENSEMBLE ERROR ---\n')
+            f.write(tb)
+        raise HTTPException(status_code=500, detail='Noise ensemble failed; logged backend_error.log')
+
+
 class GraphRequest(OdmrRequest):
     spatial_threshold: float = 0.15
     temporal_threshold: int = 1
+    # 'records': one dict per node and edge; 'columnar': feature matrix and edge index arrays
+    layout: Literal['records', 'columnar'] = 'records'
+    # columnar only: include the symmetric adjacency as CSR arrays
+    csr: bool = False
+
+    _check_grid = model_validator(mode='after')(_full_grid_only)
 
 
 @app.post("/graph")
-def graph_endpoint(req: GraphRequest):
+def graph_endpoint(req: GraphRequest, request: Request):
     """Build spatiotemporal graph from ODMR data."""
+    fmt = negotiate_format(request)
+    if fmt != 'json':
+        req.layout = 'columnar'
     try:
-        from graph import build_spatiotemporal_graph
-        
-        # run odmr simulation
-        odmr_result = odmr(req)
-        df_noisy = np.array(odmr_result['df_noisy'])
-        xs = np.array(odmr_result['xs'])
-        ys = np.array(odmr_result['ys'])
-        times = np.array(odmr_result['times'])
-        
-        # build graph
-        nodes, edges = build_spatiotemporal_graph(df_noisy, xs, ys, times, 
-                                                   spatial_threshold=req.spatial_threshold,
-                                                   temporal_threshold=req.temporal_threshold)
-        
-        return {
-            'nodes': nodes,
-            'edges': edges,
-            'n_nodes': len(nodes),
-            'n_edges': len(edges)
-        }
+        return graph_response(fmt, graph_stage(req))
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         with open('backend_error.log', 'a', encoding='utf-8') as f:
@@ -185,38 +248,28 @@ def graph_endpoint(req: GraphRequest):
 class DenoiseRequest(OdmrRequest):
     spatial_sigma: float = 1.0
     temporal_sigma: float = 1.0
+    # separable Gaussian on the (rows, cols, T) grid: 'exact', truncated 'fir' or recursive 'iir';
+    # 'flat' is the old filter over the raveled sensor index
+    gaussian_method: Literal['exact', 'fir', 'iir', 'flat'] = 'fir'
+    # graph Laplacian smoothing after the Gaussian filter; 0 iterations disables it
     n_smooth_iters: int = 3
+    smooth_alpha: float = 0.1
+    # 'stencil': shifted-array sums on the sensor grid; 'sparse': explicit graph as a CSR matrix
+    smooth_engine: Literal['stencil', 'sparse'] = 'stencil'
+    spatial_threshold: float = 0.15
+    temporal_threshold: int = 1
+
+    _check_grid = model_validator(mode='after')(_full_grid_only)
 
 
 @app.post("/denoise")
-def denoise_endpoint(req: DenoiseRequest):
+def denoise_endpoint(req: DenoiseRequest, request: Request):
     """Denoise ODMR data using Gaussian filtering and graph smoothing."""
+    fmt = negotiate_format(request)
     try:
-        from denoiser import denoise_frequency_shift, graph_smoothing
-        from graph import build_spatiotemporal_graph
-        
-        # run odmr simulation
-        odmr_result = odmr(req)
-        df_noisy = np.array(odmr_result['df_noisy'])
-        xs = np.array(odmr_result['xs'])
-        ys = np.array(odmr_result['ys'])
-        times = np.array(odmr_result['times'])
-        
-        # denoise using Gaussian filter (simplified version without full GCNN)
-        df_gaussian = denoise_frequency_shift(df_noisy, spatial_sigma=req.spatial_sigma, 
-                                              temporal_sigma=req.temporal_sigma)
-        
-        # skip graph smoothing for now (would require full PyTorch+PyG GCNN)
-        df_denoised = df_gaussian
-        
-        return {
-            'xs': odmr_result['xs'],
-            'ys': odmr_result['ys'],
-            'times': odmr_result['times'],
-            'df_shape': df_denoised.shape,
-            'df_noisy': odmr_result['df_noisy'],
-            'df_denoised': df_denoised.tolist()
-        }
+        return denoise_response(fmt, denoise_stage(req))
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         with open('backend_error.log', 'a', encoding='utf-8') as f:
@@ -224,3 +277,318 @@ def denoise_endpoint(req: DenoiseRequest):
             f.write(tb)
         raise HTTPException(status_code=500, detail='Denoising failed')
 
+
+
+def sweep_response(fmt, result):
+    sweep = result['sweep']
+    meta = dict(_coords(result), sweep_shape=result['sweep_shape'], sweep_names=result['sweep_names'],
+                sweep_values=result['sweep_values'], df_shape=sweep.shape)
+    return encode_response(fmt, {'sweep': sweep}, meta, lambda: {
+        **meta,
+        'sweep': sweep.tolist()
+    })
+
+
+class SweepRequest(DenoiseRequest):
+    # parameter name -> values; every combination is evaluated (see pipeline.SWEEP_PARAMS)
+    grid: dict[str, list] = {}
+    output: Literal['df_noisy', 'df_denoised'] = 'df_denoised'
+
+    @model_validator(mode='after')
+    def _check_grid_size(self):
+        check_sweep_grid(self.grid)
+        return self
+
+
+def _check_sweep(req):
+    try:
+        sweep_variants(req)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/sweep")
+def sweep(req: SweepRequest, request: Request):
+    """Evaluate a parameter grid over one shared simulation; results stacked along axis 0."""
+    fmt = negotiate_format(request)
+    _check_sweep(req)
+    try:
+        return sweep_response(fmt, sweep_stage(req))
+    except HTTPException:
+        raise
+    except Exception as e:
+        tb = traceback.format_exc()
+        with open('backend_error.log', 'a', encoding='utf-8') as f:
+            f.write('\n--- SWEEP ERROR ---\n')
+            f.write(tb)
+        raise HTTPException(status_code=500, detail='Sweep failed; logged backend_error.log')
+
+
+# --- streaming -------------------------------------------------------------
+
+@app.post("/stream/simulate")
+def stream_simulate(req: OdmrRequest, quantity: Literal['B', 'df'] = 'B'):
+    """Stream one binary frame per timestep as soon as it is computed.
+
+    Body is a sequence of uint32-LE-length-prefixed raw frames (see formats.encode_raw):
+    a header frame with coordinates, then one frame of B or df per timestep.
+    """
+    return StreamingResponse(length_prefixed(frame_messages(req, quantity)), media_type=FRAMES_MEDIA_TYPE)
+
+
+async def _ws_reject(websocket: WebSocket, detail):
+    """Send an error frame (a raw frame whose header holds only 'error') and close with 1008."""
+    await websocket.send_bytes(encode_raw({}, {'error': detail}))
+    await websocket.close(code=1008, reason=detail[:120])
+
+
+async def _ws_request(websocket: WebSocket, **options):
+    """Read the first WebSocket message as an OdmrRequest plus stream options.
+
+    options maps each extra field to its default. Returns (req, {option:
+    value}), or None after rejecting a message that is not a JSON object or
+    does not validate.
+    """
+    try:
+        params = await websocket.receive_json()
+    except (ValueError, KeyError):
+        await _ws_reject(websocket, 'the first message must be the request as a JSON object')
+        return None
+    if not isinstance(params, dict):
+        await _ws_reject(websocket, f'the request must be a JSON object, not {type(params).__name__}')
+        return None
+    values = {name: params.pop(name, default) for name, default in options.items()}
+    try:
+        req = OdmrRequest(**params)
+    except ValidationError as e:
+        await _ws_reject(websocket, str(e))
+        return None
+    if values.get('quantity', 'B') not in ('B', 'df'):
+        await _ws_reject(websocket, "quantity must be 'B' or 'df'")
+        return None
+    return req, values
+
+
+@app.websocket("/ws/simulate")
+async def ws_simulate(websocket: WebSocket):
+    """WebSocket variant of /stream/simulate: send the request JSON (plus an
+    optional 'quantity'), receive one binary message per frame."""
+    await websocket.accept()
+    received = await _ws_request(websocket, quantity='B')
+    if received is None:
+        return
+    req, options = received
+    await websocket_stream(websocket, frame_messages(req, options['quantity']))
+
+
+@app.post("/stream/progressive")
+def stream_progressive(req: OdmrRequest, quantity: Literal['B', 'df'] = 'B',
+                       target_ms: float = Query(100.0, gt=0)):
+    """Stream a quick low-resolution preview first, then refined levels up to the full result.
+
+    Body is a sequence of uint32-LE-length-prefixed raw frames, one per level
+    (see streaming.progressive_messages); the first aims to be computed
+    within target_ms and the last equals /simulate for the same request.
+    """
+    return StreamingResponse(length_prefixed(progressive_messages(req, quantity, target_ms)),
+                             media_type=FRAMES_MEDIA_TYPE)
+
+
+@app.websocket("/ws/progressive")
+async def ws_progressive(websocket: WebSocket):
+    """WebSocket variant of /stream/progressive: send the request JSON (plus
+    optional 'quantity' and 'target_ms'), receive one binary message per level."""
+    await websocket.accept()
+    received = await _ws_request(websocket, quantity='B', target_ms=100.0)
+    if received is None:
+        return
+    req, options = received
+    target_ms = options['target_ms']
+    if isinstance(target_ms, bool) or not isinstance(target_ms, (int, float)) or target_ms <= 0:
+        await _ws_reject(websocket, 'target_ms must be a positive number')
+        return
+    await websocket_stream(websocket, progressive_messages(req, options['quantity'], target_ms))
+
+
+# --- sessions --------------------------------------------------------------
+
+SESSIONS = SessionStore(max_sessions=int(os.environ.get('LUCERNA_MAX_SESSIONS', 8)),
+                        kernel_bytes=int(os.environ.get('LUCERNA_SESSION_KERNEL_BYTES', DEFAULT_KERNEL_BYTES)),
+                        frame_bytes=int(os.environ.get('LUCERNA_SESSION_FRAME_BYTES', DEFAULT_FRAME_BYTES)))
+
+
+class TimeWindow(BaseModel):
+    t_max: float
+    n_time: int
+
+
+def session_response(fmt, session, result):
+    return simulate_response(fmt, result, {'session_id': session.id, 'computed_frames': result['computed'],
+                                           'reused_frames': result['reused']})
+
+
+def _session_simulate(session, window, fmt):
+    try:
+        return session_response(fmt, session, session.simulate(window.t_max, window.n_time))
+    except HTTPException:
+        raise
+    except Exception as e:
+        tb = traceback.format_exc()
+        with open('backend_error.log', 'a', encoding='utf-8') as f:
+            f.write('\n--- SESSION ERROR ---\n')
+            f.write(tb)
+        raise HTTPException(status_code=500, detail='Session simulation failed; logged backend_error.log')
+
+
+@app.post("/sessions")
+def create_session(req: SimRequest, request: Request):
+    """Simulate req and keep its geometry and frames under the returned session_id."""
+    fmt = negotiate_format(request)
+    try:
+        session = SESSIONS.create(req)
+    except Exception as e:
+        tb = traceback.format_exc()
+        with open('backend_error.log', 'a', encoding='utf-8') as f:
+            f.write('\n--- SESSION ERROR ---\n')
+            f.write(tb)
+        raise HTTPException(status_code=500, detail='Session creation failed; logged backend_error.log')
+    return _session_simulate(session, TimeWindow(t_max=req.t_max, n_time=req.n_time), fmt)
+
+
+def _get_session(session_id):
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f'Unknown session {session_id}')
+    return session
+
+
+@app.post("/sessions/{session_id}/simulate")
+def session_simulate(session_id: str, window: TimeWindow, request: Request):
+    """/simulate for a new time window of the session; only unseen timesteps are computed."""
+    fmt = negotiate_format(request)
+    return _session_simulate(_get_session(session_id), window, fmt)
+
+
+@app.get("/sessions")
+def list_sessions():
+    return SESSIONS.list()
+
+
+@app.get("/sessions/{session_id}")
+def session_info(session_id: str):
+    return _get_session(session_id).info()
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    info = _get_session(session_id).info()
+    SESSIONS.delete(session_id)
+    return info
+
+
+# --- background jobs -------------------------------------------------------
+
+JOBS = JobManager(max_running=int(os.environ.get('LUCERNA_MAX_JOBS', 2)),
+                  max_active=int(os.environ.get('LUCERNA_MAX_ACTIVE_JOBS', 8)),
+                  max_result_bytes=int(os.environ.get('LUCERNA_JOB_RESULT_BYTES', DEFAULT_RESULT_BYTES)))
+
+# job kind -> (stage, response builder, result keys the builder reads)
+_COORDS = ('xs', 'ys', 'times')
+JOB_KINDS = {
+    'simulate': (simulate_stage, simulate_response, _COORDS + ('Btime',)),
+    'odmr': (odmr_stage, odmr_response, _COORDS + ('df_clean', 'df_noisy')),
+    'graph': (graph_stage, graph_response, _COORDS + ('graph', 'nodes', 'edges')),
+    'denoise': (denoise_stage, denoise_response, _COORDS + ('df_noisy', 'df_denoised')),
+    'sweep': (sweep_stage, sweep_response,
+              _COORDS + ('sweep', 'sweep_shape', 'sweep_names', 'sweep_values')),
+}
+
+
+def _submit_job(kind, req):
+    stage, _, keys = JOB_KINDS[kind]
+
+    def run(progress):
+        # keep only what the response builder needs, not the intermediate stages
+        result = stage(req, progress)
+        return {key: result[key] for key in keys if key in result}
+
+    try:
+        job = JOBS.submit(kind, req.model_dump(), run)
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JSONResponse(job.info(), status_code=202)
+
+
+@app.post("/jobs/simulate")
+def submit_simulate_job(req: SimRequest):
+    """Start /simulate in the background; poll GET /jobs/{job_id} for progress."""
+    return _submit_job('simulate', req)
+
+
+@app.post("/jobs/odmr")
+def submit_odmr_job(req: OdmrRequest):
+    return _submit_job('odmr', req)
+
+
+@app.post("/jobs/graph")
+def submit_graph_job(req: GraphRequest):
+    return _submit_job('graph', req)
+
+
+@app.post("/jobs/denoise")
+def submit_denoise_job(req: DenoiseRequest):
+    return _submit_job('denoise', req)
+
+
+@app.post("/jobs/sweep")
+def submit_sweep_job(req: SweepRequest):
+    _check_sweep(req)
+    return _submit_job('sweep', req)
+
+
+@app.get("/jobs")
+def list_jobs():
+    return JOBS.list()
+
+
+def _get_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f'Unknown job {job_id}')
+    return job
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _get_job(job_id).info()
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str, request: Request):
+    """Result of a finished job, in the same formats as the synchronous endpoint."""
+    fmt = negotiate_format(request)
+    job = _get_job(job_id)
+    if job.status == 'expired':
+        raise HTTPException(status_code=410, detail=f'The result of job {job_id} was dropped; resubmit it')
+    if job.status != 'done':
+        raise HTTPException(status_code=409, detail=f'Job {job_id} is {job.status}')
+    return JOB_KINDS[job.kind][1](fmt, job.result)
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job; running jobs stop at their next progress update."""
+    _get_job(job_id)
+    return JOBS.cancel(job_id).info()
+
+
+@app.get("/cache")
+def cache_stats():
+    """Per-stage hit/miss counters and memory usage of the result cache."""
+    return STAGE_CACHE.stats()
+
+
+@app.delete("/cache")
+def cache_clear():
+    STAGE_CACHE.clear()
+    return STAGE_CACHE.stats()
@@ -0,0 +1,243 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from simulation.field import _as_currents, biot_savart_kernel
+from pipeline import STAGE_CACHE, SIMULATE_PARAMS, build_geometry, field_timeseries, geometry_currents, stage_params
+
+# kernels kept across all sessions of a store
+DEFAULT_KERNEL_BYTES = 256 * 1024 ** 2
+# frames kept across all sessions of a store
+DEFAULT_FRAME_BYTES = 512 * 1024 ** 2
+
+# times closer than this fraction of the window are the same timestep
+TIME_RTOL = 1e-9
+
+
+class SimulationSession:
+    """Geometry and computed frames of one simulation, extended in time on demand.
+
+    The population, sensor grid and packed segments are built once. Every
+    frame computed so far is kept by its time, so a later window only
+    computes the times it has not seen; a grid that refines or extends an
+    earlier one reuses all the old frames. With the kernel engine the
+    Biot-Savart kernel itself is kept when `store` (a SessionStore) grants
+    room for it in its kernel budget, and new frames cost one GEMM; a
+    session without a store keeps no kernel. The store also bounds the
+    frames: when they exceed its frame budget, frames outside a session's
+    latest window are dropped first.
+    """
+
+    def __init__(self, req, store=None):
+        self.id = uuid.uuid4().hex
+        self.req = req
+        self.created = self.last_used = time.time()
+        self.geometry = build_geometry(req)
+        N = self.geometry['sensor_points'].shape[0]
+        self.times = np.empty(0)
+        self.Btime = np.empty((N, 0, 3), dtype=req.dtype)
+        self.window = np.empty(0)
+        self.store = store
+        self._kernel = None
+        self._lock = threading.Lock()
+
+    def _match(self, times):
+        """Index of each of times in self.times, -1 where it has not been computed."""
+        n = self.times.size
+        if n == 0:
+            return np.full(times.shape, -1)
+        tol = TIME_RTOL * max(np.abs(times).max(initial=0.0), np.abs(self.times).max())
+        pos = np.searchsorted(self.times, times)
+        lo, hi = np.clip(pos - 1, 0, n - 1), np.clip(pos, 0, n - 1)
+        near = np.where(np.abs(self.times[lo] - times) <= np.abs(self.times[hi] - times), lo, hi)
+        return np.where(np.abs(self.times[near] - times) <= tol, near, -1)
+
+    def _field(self, times, progress=None):
+        """B (N, len(times), 3) computed from scratch for times."""
+        req, geom = self.req, self.geometry
+        currents = _as_currents(geometry_currents(req, geom, times), np.dtype(req.dtype))
+        table, sensors = geom['table'], geom['sensor_points']
+        N, M = sensors.shape[0], table['start'].shape[0]
+        K = self._kernel
+        if K is None and req.engine == 'kernel' and not req.cutoff and self.store is not None \
+                and self.store.reserve_kernel(self, 3 * N * M * np.dtype(req.dtype).itemsize):
+            K = biot_savart_kernel(table['start'], table['end'], sensors, req.segment_kernel,
+                                   req.dtype).reshape((N * 3, M))
+            self.store.keep_kernel(self, K)
+        if K is not None:
+            B = (K @ np.ascontiguousarray(currents.T)).reshape((N, 3, -1))
+            if progress is not None:
+                progress(1, 1)
+            return np.ascontiguousarray(B.transpose(0, 2, 1))
+        return field_timeseries(req, geom, currents, progress)
+
+    def simulate(self, t_max, n_time, progress=None):
+        """Simulation result for the window np.linspace(0, t_max, n_time).
+
+        Returns the simulate_stage dict for that window plus 'computed' and
+        'reused' frame counts. The result is also put in the stage cache, so
+        /odmr, /denoise etc. for the same window reuse it.
+        """
+        times = np.linspace(0, t_max, n_time)
+        with self._lock:
+            self.last_used = time.time()
+            idx = self._match(times)
+            missing = np.unique(times[idx < 0])
+            if missing.size:
+                merged = np.concatenate([self.times, missing])
+                order = np.argsort(merged, kind='stable')
+                self.Btime = np.concatenate([self.Btime, self._field(missing, progress)], axis=1)[:, order]
+                self.times = merged[order]
+                idx = self._match(times)
+            Btime = self.Btime[:, idx]
+            self.window = times
+        if self.store is not None:
+            self.store.trim_frames(self)
+        geom = self.geometry
+        req = self.req.model_copy(update={'t_max': t_max, 'n_time': n_time})
+        result = {'xs': geom['xs'], 'ys': geom['ys'], 'times': times, 'sensor_points': geom['sensor_points'],
+                  'table': geom['table'], 'Btime': Btime}
+        STAGE_CACHE.put('simulate', stage_params(req, SIMULATE_PARAMS), result)
+        return dict(result, computed=int(missing.size), reused=int(n_time - missing.size))
+
+    def keep_window(self):
+        """Drop the frames outside the latest window; returns the bytes freed."""
+        with self._lock:
+            before = self.Btime.nbytes
+            keep = np.unique(self._match(self.window))
+            keep = keep[keep >= 0]
+            self.Btime = self.Btime[:, keep]
+            self.times = self.times[keep]
+            return before - self.Btime.nbytes
+
+    def clear_frames(self):
+        """Drop every frame; returns the bytes freed."""
+        with self._lock:
+            freed = self.Btime.nbytes
+            self.Btime = self.Btime[:, :0]
+            self.times = self.times[:0]
+            return freed
+
+    def info(self):
+        return {
+            'session_id': self.id,
+            'created': self.created,
+            'last_used': self.last_used,
+            'n_frames': int(self.times.size),
+            't_range': [float(self.times[0]), float(self.times[-1])] if self.times.size else None,
+            'kernel_cached': self._kernel is not None,
+            'bytes': int(self.Btime.nbytes + (self._kernel.nbytes if self._kernel is not None else 0)),
+            'params': self.req.model_dump(),
+        }
+
+
+class SessionStore:
+    """The most recently used simulation sessions, at most max_sessions of them.
+
+    kernel_bytes bounds the Biot-Savart kernels kept by all sessions
+    together. A session that wants to keep a kernel reserves its size
+    first; the kernels of the least recently used other sessions are
+    dropped to make room (the sessions themselves, and their frames, stay).
+
+    frame_bytes bounds the frames kept by all sessions together; see
+    trim_frames.
+    """
+
+    def __init__(self, max_sessions=8, kernel_bytes=DEFAULT_KERNEL_BYTES, frame_bytes=DEFAULT_FRAME_BYTES):
+        self.max_sessions = max_sessions
+        self.kernel_bytes = kernel_bytes
+        self.frame_bytes = frame_bytes
+        self._sessions = OrderedDict()
+        self._kernels = {}  # session id -> reserved kernel bytes
+        self._lock = threading.Lock()
+
+    def create(self, req):
+        """New session for req's geometry; the least recently used one is dropped when full."""
+        session = SimulationSession(req, store=self)
+        with self._lock:
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                _, dropped = self._sessions.popitem(last=False)
+                self._drop_kernel(dropped)
+        return session
+
+    def _drop_kernel(self, session):
+        self._kernels.pop(session.id, None)
+        session._kernel = None
+
+    def reserve_kernel(self, session, nbytes):
+        """Reserve nbytes of the kernel budget for session; False when it does not fit at all."""
+        if nbytes > self.kernel_bytes:
+            return False
+        with self._lock:
+            if session.id not in self._sessions:
+                return False
+            self._kernels.pop(session.id, None)
+            # sessions are kept in least recently used order
+            holders = [other for other in self._sessions.values() if other.id in self._kernels]
+            while sum(self._kernels.values()) + nbytes > self.kernel_bytes:
+                self._drop_kernel(holders.pop(0))
+            self._kernels[session.id] = nbytes
+        return True
+
+    def keep_kernel(self, session, kernel):
+        """Attach a freshly built kernel to session unless its reservation was dropped meanwhile."""
+        with self._lock:
+            if self._kernels.get(session.id) == kernel.nbytes:
+                session._kernel = kernel
+
+    def trim_frames(self, session):
+        """Bring the frames of all sessions within frame_bytes after session computed some.
+
+        Frames outside each session's latest window go first, least recently
+        used sessions first and session itself last. Then the least recently
+        used other sessions are dropped; if session's own window still does
+        not fit, its frames are dropped too.
+        """
+        with self._lock:
+            others = [other for other in self._sessions.values() if other is not session]
+        total = session.Btime.nbytes + sum(other.Btime.nbytes for other in others)
+        for other in others + [session]:
+            if total <= self.frame_bytes:
+                return
+            total -= other.keep_window()
+        for other in others:
+            if total <= self.frame_bytes:
+                return
+            if self.delete(other.id) is not None:
+                total -= other.Btime.nbytes
+        if total > self.frame_bytes:
+            session.clear_frames()
+
+    @property
+    def frame_nbytes(self):
+        """Frame bytes kept by all sessions."""
+        with self._lock:
+            return sum(session.Btime.nbytes for session in self._sessions.values())
+
+    @property
+    def kernel_nbytes(self):
+        """Kernel bytes reserved by all sessions."""
+        with self._lock:
+            return sum(self._kernels.values())
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._drop_kernel(session)
+            return session
+
+    def list(self):
+        with self._lock:
+            return [session.info() for session in self._sessions.values()]
@@ -0,0 +1,229 @@
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import ndimage, sparse
+
+from .field import DEFAULT_MEMORY_BUDGET, MU0, compute_field_timeseries
+
+
+def _bilinear_weights(coord, origin, step, n):
+    """Cloud-in-cell indices and weights of coordinates on a 1D lattice."""
+    u = (coord - origin) / step
+    i0 = np.clip(np.floor(u).astype(np.int64), 0, n - 2)
+    f = np.clip(u - i0, 0.0, 1.0)
+    return i0, f
+
+
+def _depth_planes(z, near_depth, n_slabs):
+    """Source planes for the far segments: geometric in |z| on each side of z=0."""
+    planes = []
+    for sign in (-1.0, 1.0):
+        depth = np.abs(z[np.sign(z) == sign])
+        depth = depth[depth >= near_depth]
+        if depth.size == 0:
+            continue
+        if depth.max() > near_depth:
+            levels = np.geomspace(near_depth, depth.max(), max(2, n_slabs))
+        else:
+            levels = np.array([near_depth])
+        planes.append(sign * levels)
+    return np.sort(np.concatenate(planes)) if planes else np.zeros(0)
+
+
+def _lattice_factors(distance, h, lattice_factor, max_factor):
+    """Largest power of two r <= max_factor with r*h <= distance / lattice_factor (at least 1)."""
+    r = np.floor(np.log2(np.maximum(distance / (lattice_factor * h), 1.0)))
+    return (2 ** np.clip(r, 0, np.floor(np.log2(max_factor)))).astype(np.int64)
+
+
+def _spline_matrix(n, r):
+    """(n, m) cubic-spline interpolation from a lattice of spacing r (two-node margin) to n points.
+
+    Row i interpolates at lattice coordinate i/r + 2; tensor-product splines
+    are separable, so W_y @ F @ W_x.T interpolates a 2D field F.
+    """
+    m = -(-(n - 1) // r) + 5
+    coords = np.arange(n)[None, :] / r + 2
+    return np.stack([ndimage.map_coordinates(unit, coords, order=3, mode='nearest') for unit in np.eye(m)], axis=1)
+
+
+def _lattice_convolution(mid, dl, currents, sources, x0, hx, nx, y0, hy, ny, memory_budget, workers=1):
+    """B on the lattice x0 + hx*arange(nx), y0 + hy*arange(ny) of the far sources.
+
+    sources: list of (z_k, sel, w): segments sel weighted by w on the depth
+    plane z_k. They are spread onto a source lattice with the same spacing,
+    extended to cover them. Timesteps are processed in chunks whose FFT
+    buffers fit in memory_budget; the spreading operator and the
+    Green's-function FFTs of a plane are built once and shared by the chunks.
+    workers threads run each FFT.
+
+    Returns (3, T, ny, nx)
+    """
+    T = currents.shape[0]
+    out = np.zeros((3, T, ny, nx))
+    used = mid[np.concatenate([sel for _, sel, _ in sources])]
+
+    # source lattice aligned with the sensor lattice, extended to cover every source
+    gx0 = x0 + hx * np.floor(min(0.0, (used[:, 0].min() - x0) / hx))
+    gy0 = y0 + hy * np.floor(min(0.0, (used[:, 1].min() - y0) / hy))
+    gnx = int(np.ceil((max(x0 + hx * (nx - 1), used[:, 0].max()) - gx0) / hx)) + 2
+    gny = int(np.ceil((max(y0 + hy * (ny - 1), used[:, 1].max()) - gy0) / hy)) + 2
+    ox = int(round((x0 - gx0) / hx))
+    oy = int(round((y0 - gy0) / hy))
+
+    # linear convolution of a (gny, gnx) source with sensor offsets needs
+    # kernel offsets in [-(g-1), n-1]; pad to a fast FFT length
+    py = sp_fft.next_fast_len(gny + ny - 1, real=True)
+    px = sp_fft.next_fast_len(gnx + nx - 1, real=True)
+    # kernel offset lattice: sensor - source, wrapped for circular convolution
+    dx = np.arange(px)
+    dx = np.where(dx < nx + ox, dx, dx - px) * hx
+    dy = np.arange(py)
+    dy = np.where(dy < ny + oy, dy, dy - py) * hy
+    DX, DY = np.meshgrid(dx, dy)
+
+    ix, fx = _bilinear_weights(mid[:, 0], gx0, hx, gnx)
+    iy, fy = _bilinear_weights(mid[:, 1], gy0, hy, gny)
+    coeff = MU0 / (4 * np.pi)
+
+    # moments, their spectra, the three field spectra and one real field per timestep
+    per_step = 8 * (3 * gny * gnx + 12 * py * (px // 2 + 1) + py * px)
+    t_chunk = int(np.clip(memory_budget // per_step, 1, T))
+
+    for z_k, sel, wz in sources:
+        # sparse (cells x segments) spreading operator, so all timesteps grid at once
+        rows, vals = [], []
+        for ddy, wy in ((0, 1.0 - fy[sel]), (1, fy[sel])):
+            for ddx, wx in ((0, 1.0 - fx[sel]), (1, fx[sel])):
+                rows.append((iy[sel] + ddy) * gnx + (ix[sel] + ddx))
+                vals.append(wz * wy * wx)
+        cols = np.tile(np.arange(sel.size), 4)
+        spread = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), cols)),
+                                   shape=(gny * gnx, sel.size))
+
+        # Green's function of a unit moment at depth z_k seen from z=0
+        rz = -z_k
+        r3 = np.sqrt(DX * DX + DY * DY + rz * rz) ** 3
+        G = [sp_fft.rfft2(comp * coeff / r3, workers=workers) for comp in (DX, DY, np.full_like(DX, rz))]
+
+        for t0 in range(0, T, t_chunk):
+            t1 = min(T, t0 + t_chunk)
+            # gridded current moments q_c = sum I dl_c, (3, t, gny, gnx)
+            moments = np.empty((3, t1 - t0, gny, gnx))
+            for c in range(3):
+                moments[c] = (spread @ (currents[t0:t1, sel] * dl[sel, c]).T).T.reshape((t1 - t0, gny, gnx))
+            Q = sp_fft.rfft2(moments, s=(py, px), axes=(-2, -1), workers=workers)
+            del moments
+
+            # B = q x r
+            B = (Q[1] * G[2] - Q[2] * G[1], Q[2] * G[0] - Q[0] * G[2], Q[0] * G[1] - Q[1] * G[0])
+            del Q
+            for c in range(3):
+                field = sp_fft.irfft2(B[c], s=(py, px), axes=(-2, -1), workers=workers)
+                out[c, t0:t1] += field[:, oy:oy + ny, ox:ox + nx]
+    return out
+
+
+def compute_field_timeseries_fft(segments_start, segments_end, currents, xs, ys, n_slabs=16,
+                                 near_factor=4.0, progress=None, kernel='midpoint', lattice_factor=4.0,
+                                 memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """Compute B on a regular z=0 sensor grid with per-slab FFT convolutions.
+
+    Segment current moments I*dl are spread onto XY lattices (cloud-in-cell),
+    and linearly between a set of depth planes that are spaced geometrically
+    in |z|. Within a plane all sources share a depth, so B is a 2D
+    convolution of the gridded moments with the Biot-Savart Green's function
+    at that depth: O(G log G) per plane and timestep instead of O(N*M).
+
+    A source at distance e from the sensors (its plane's depth combined with
+    its horizontal distance to the sensor rectangle) gives a field that
+    varies on scales of e. It is spread onto a lattice whose spacing is the
+    sensor spacing times the largest power of two below e / lattice_factor.
+    The sources of each spacing are convolved on their own lattice, which
+    only has to cover them, and the result is interpolated to the sensors
+    with cubic splines. Only shallow sources under the sensors need the full
+    resolution. Segments closer to the sensor plane than near_factor sensor
+    spacings cannot be resolved by a lattice and are summed exactly.
+
+    segments_start, segments_end: arrays (M,3)
+    currents: (T,M) current magnitudes per timestep
+    xs, ys: uniformly spaced sensor coordinates (sensors at meshgrid(xs, ys), z=0)
+    n_slabs: number of depth planes on each side of the sensor plane
+    near_factor: near-field depth, in lattice spacings, below which segments are summed exactly
+    progress: optional callable progress(done, total) over the near-field sum and lattices
+    kernel: 'midpoint' or exact 'segment' kernel for the near-field sum
+    lattice_factor: source distance, in lattice spacings, that a coarse lattice must keep
+    memory_budget: approximate bytes of FFT buffers; timesteps are processed in chunks within it
+    workers: threads per FFT
+
+    Returns Btime: (len(ys)*len(xs), T, 3) in the same order as the raveled meshgrid
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    currents = np.asarray(currents, dtype=float)
+    T = currents.shape[0]
+    nx, ny = xs.size, ys.size
+    hx = (xs[-1] - xs[0]) / (nx - 1) if nx > 1 else 1.0
+    hy = (ys[-1] - ys[0]) / (ny - 1) if ny > 1 else 1.0
+
+    mid = 0.5 * (segments_start + segments_end)
+    dl = segments_end - segments_start
+    z = mid[:, 2]
+
+    out = np.zeros((3, T, ny, nx), dtype=float)
+
+    near_depth = near_factor * max(hx, hy)
+    near = np.abs(z) < near_depth
+    if near.any():
+        XX, YY = np.meshgrid(xs, ys)
+        sensors = np.stack([XX.ravel(), YY.ravel(), np.zeros(XX.size)], axis=1)
+        B_near = compute_field_timeseries(segments_start[near], segments_end[near],
+                                          currents[:, near], sensors, kernel=kernel)
+        out += B_near.reshape((ny, nx, T, 3)).transpose(3, 2, 0, 1)
+    far = np.nonzero(~near)[0]
+    if far.size == 0:
+        if progress is not None:
+            progress(1, 1)
+        return np.ascontiguousarray(out.transpose(2, 3, 1, 0).reshape((ny * nx, T, 3)))
+    mid, dl, z, currents = mid[far], dl[far], z[far], currents[:, far]
+
+    # linear weights of each segment on its two neighbouring depth planes
+    planes = _depth_planes(z, near_depth, n_slabs)
+    if planes.size == 1:
+        k0 = np.zeros(z.size, dtype=np.int64)
+        fz = np.zeros(z.size)
+    else:
+        k0 = np.clip(np.searchsorted(planes, z, side='right') - 1, 0, planes.size - 2)
+        fz = np.clip((z - planes[k0]) / (planes[k0 + 1] - planes[k0]), 0.0, 1.0)
+
+    # horizontal distance of each segment to the sensor rectangle
+    rho = np.hypot(np.maximum(0.0, np.maximum(xs[0] - mid[:, 0], mid[:, 0] - xs[-1])),
+                   np.maximum(0.0, np.maximum(ys[0] - mid[:, 1], mid[:, 1] - ys[-1])))
+    # coarse lattices keep at least a few points per axis
+    max_factor = max(1, (min(nx, ny) - 1) // 4)
+    groups = {}
+    for k, z_k in enumerate(planes):
+        sel_lo = np.nonzero(k0 == k)[0]
+        sel_hi = np.nonzero((k0 + 1 == k) & (fz > 0))[0]
+        sel = np.concatenate([sel_lo, sel_hi])
+        wz = np.concatenate([1.0 - fz[sel_lo], fz[sel_hi]])
+        factors = _lattice_factors(np.hypot(z_k, rho[sel]), max(hx, hy), lattice_factor, max_factor)
+        for r in np.unique(factors):
+            hit = factors == r
+            groups.setdefault(int(r), []).append((z_k, sel[hit], wz[hit]))
+
+    if progress is not None:
+        progress(1, len(groups) + 1)
+    for done, (r, sources) in enumerate(sorted(groups.items()), start=2):
+        if r == 1:
+            out += _lattice_convolution(mid, dl, currents, sources, xs[0], hx, nx, ys[0], hy, ny, memory_budget,
+                                        workers)
+        else:
+            # coarse lattice over the sensors with a two-node margin for the splines
+            wx, wy = _spline_matrix(nx, r), _spline_matrix(ny, r)
+            coarse = _lattice_convolution(mid, dl, currents, sources, xs[0] - 2 * r * hx, r * hx, wx.shape[1],
+                                          ys[0] - 2 * r * hy, r * hy, wy.shape[1], memory_budget, workers)
+            out += wy @ coarse @ wx.T
+        if progress is not None:
+            progress(done, len(groups) + 1)
+
+    return np.ascontiguousarray(out.transpose(2, 3, 1, 0).reshape((ny * nx, T, 3)))
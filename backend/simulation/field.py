@@ -1,7 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+import multiprocessing
+from multiprocessing import shared_memory
+
 import numpy as np
+from scipy.spatial import cKDTree
 
 MU0 = 4e-7 * np.pi
 
+# default working-set size for engines that tile their temporaries (bytes)
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+
 
 def compute_biot_savart(segments_start, segments_end, currents, sensor_points):
     """Compute magnetic field at sensor_points due to multiple short current segments.
@@ -40,6 +49,478 @@ def compute_biot_savart(segments_start, segments_end, currents, sensor_points):
     return B
 
 
+def _kernel_block(mid, dl, sensor_points, out, kernel='midpoint', cutoff=None):
+    """Fill out (n,3,m) with the Biot-Savart kernel of unit currents.
+
+    mid, dl: (m,3) segment midpoints and direction vectors
+    sensor_points: (n,3)
+    out: (n,3,m) float64 or float32 array; the kernel is computed in its dtype
+    kernel: 'midpoint' treats each segment as a current element at its
+      midpoint; 'segment' uses the exact field of a straight finite wire
+    cutoff: optional radius; segments whose midpoint is farther than this
+      from a sensor contribute 0 to it
+
+    The sensor - midpoint offsets are formed in the precision of the inputs
+    (float64 geometry) before rounding to out.dtype, so a sensor close to a
+    segment keeps an accurate r instead of the cancelled difference of two
+    rounded positions. Pairs whose r^3 (or finite-wire denominator)
+    underflows get 0 rather than inf/nan.
+    """
+    dtype = out.dtype
+    n, m = sensor_points.shape[0], mid.shape[0]
+    # work per component so the kernel comes out in (n,3,m) layout; the
+    # subtraction runs in the inputs' precision and is rounded on store
+    rx, ry, rz = (np.subtract(sensor_points[:, i, None], mid[None, :, i], out=np.empty((n, m), dtype),
+                              casting='same_kind') for i in range(3))  # (n,m)
+    dl = dl.astype(dtype, copy=False)
+
+    # dl x r
+    np.subtract(dl[:, 1] * rz, dl[:, 2] * ry, out=out[:, 0])
+    np.subtract(dl[:, 2] * rx, dl[:, 0] * rz, out=out[:, 1])
+    np.subtract(dl[:, 0] * ry, dl[:, 1] * rx, out=out[:, 2])
+
+    if kernel == 'segment':
+        scale = _segment_factor(rx, ry, rz, dl, out)
+    elif kernel == 'midpoint':
+        r_norm3 = np.sqrt(rx * rx + ry * ry + rz * rz) ** 3
+        # avoid zero (and 1/r^3 overflowing to inf once r^3 is denormal)
+        r_norm3[r_norm3 < np.finfo(dtype).tiny] = np.inf
+        scale = np.divide(dtype.type(MU0 / (4 * np.pi)), r_norm3, out=r_norm3)
+    else:
+        raise ValueError(f"unknown kernel {kernel!r}")
+    if cutoff:
+        scale[rx * rx + ry * ry + rz * rz > dtype.type(cutoff) ** 2] = 0
+    out *= scale[:, None, :]
+    return out
+
+
+def _segment_factor(rx, ry, rz, dl, cross):
+    """Scalar g with B = g * (dl x r) for a straight segment, r from its midpoint.
+
+    Exact finite-wire field (Hanson & Hirshman 2002):
+    g = mu0/(4 pi) * 2 (Ri + Rf) / (Ri Rf ((Ri + Rf)^2 - L^2)), with Ri, Rf the
+    distances to the segment ends and L its length; far away g -> mu0/(4 pi)/r^3.
+    Points on the segment itself get 0.
+
+    (Ri + Rf)^2 - L^2 = 2 (Ri Rf + ri.rf) cancels next to the segment, where
+    ri.rf ~ -Ri Rf. There it is evaluated as 2 |dl x r|^2 / (Ri Rf - ri.rf)
+    instead (ri x rf = dl x r), which loses no digits; cross is the (n,3,m)
+    dl x r already in the kernel buffer.
+    """
+    hx, hy, hz = 0.5 * dl[:, 0], 0.5 * dl[:, 1], 0.5 * dl[:, 2]
+    Ri = np.sqrt((rx + hx) ** 2 + (ry + hy) ** 2 + (rz + hz) ** 2)
+    Rf = np.sqrt((rx - hx) ** 2 + (ry - hy) ** 2 + (rz - hz) ** 2)
+    prod = Ri * Rf
+    # ri.rf = |r|^2 - |dl/2|^2
+    dot = rx * rx + ry * ry + rz * rz - np.einsum('mi,mi->m', dl, dl) / 4
+    c2 = np.einsum('nim,nim->nm', cross, cross)
+    near = dot < 0
+    half = np.where(near, c2 / np.where(near, prod - dot, 1), prod + dot)
+    denom = np.multiply(prod, half, out=prod)
+    denom[denom < np.finfo(denom.dtype).tiny] = np.inf
+    Ri += Rf
+    Ri *= denom.dtype.type(MU0 / (4 * np.pi))
+    return np.divide(Ri, denom, out=denom)
+
+
+def _tile_shape(N, M, memory_budget, itemsize):
+    """Pick a (sensor, segment) tile size whose temporaries fit in memory_budget.
+
+    A tile holds its (n,3,m) kernel plus ~6 (n,m) temporaries while it is built.
+    """
+    per_pair = 9 * itemsize
+    n_block = int(max(1, min(N, memory_budget // max(per_pair * M, 1))))
+    m_block = int(max(1, min(M, memory_budget // (per_pair * n_block))))
+    return n_block, m_block
+
+
+def _iter_kernel_tiles(mid, dl, sensor_points, memory_budget, dtype, kernel='midpoint', cutoff=None):
+    """Yield (n0, n1, m0, m1, K) kernel tiles covering all sensors x segments.
+
+    K is a contiguous (n1-n0, 3, m1-m0) view into a scratch buffer that is
+    reused between tiles, so consume it before advancing the iterator.
+    """
+    N = sensor_points.shape[0]
+    M = mid.shape[0]
+    n_block, m_block = _tile_shape(N, M, memory_budget, np.dtype(dtype).itemsize)
+    scratch = np.empty(n_block * 3 * m_block, dtype=dtype)
+    for n0 in range(0, N, n_block):
+        n1 = min(N, n0 + n_block)
+        for m0 in range(0, M, m_block):
+            m1 = min(M, m0 + m_block)
+            K = scratch[:(n1 - n0) * 3 * (m1 - m0)].reshape((n1 - n0, 3, m1 - m0))
+            _kernel_block(mid[m0:m1], dl[m0:m1], sensor_points[n0:n1], K, kernel, cutoff)
+            yield n0, n1, m0, m1, K
+
+
+def biot_savart_kernel(segments_start, segments_end, sensor_points, kernel='midpoint', dtype=None, cutoff=None,
+                       memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Biot-Savart kernel of unit currents on each segment.
+
+    Geometry is fixed while currents change, so B = K . I for any current vector.
+    K is filled tile by tile, so beyond K itself the build needs only
+    about memory_budget bytes of scratch.
+
+    segments_start, segments_end: arrays (M,3)
+    sensor_points: (N,3)
+    kernel: 'midpoint' or 'segment' (see _kernel_block)
+    dtype: kernel dtype (default float64)
+    cutoff: optional radius beyond which segments are left out (see _kernel_block)
+
+    Returns K: (N,3,M) such that B[n] = K[n] @ currents
+    """
+    dtype = np.dtype(float if dtype is None else dtype)
+    mid = 0.5 * (segments_start + segments_end)
+    dl = (segments_end - segments_start)
+    K = np.empty((sensor_points.shape[0], 3, mid.shape[0]), dtype=dtype)
+    for n0, n1, m0, m1, tile in _iter_kernel_tiles(mid, dl, sensor_points, memory_budget, dtype, kernel, cutoff):
+        K[n0:n1, :, m0:m1] = tile
+    return K
+
+
+def compute_biot_savart_chunked(segments_start, segments_end, currents, sensor_points,
+                                memory_budget=DEFAULT_MEMORY_BUDGET, out=None, dtype=None, kernel='midpoint',
+                                cutoff=None):
+    """Memory-bounded compute_biot_savart.
+
+    Accumulates B over sensor x segment tiles so the (N,M,3) intermediates are
+    never materialized; peak scratch memory stays around `memory_budget` bytes.
+
+    segments_start, segments_end: arrays (M,3)
+    currents: scalar or (M,) current magnitudes
+    sensor_points: (N,3)
+    out: optional (N,3) array to write B into (may be a strided view)
+    dtype: computation dtype (default float64; np.float32 halves memory traffic)
+    kernel: 'midpoint' or 'segment' (see _kernel_block)
+    cutoff: optional radius beyond which segments are left out (see _kernel_block)
+
+    Returns B: (N,3)
+    """
+    dtype = np.dtype(float if dtype is None else dtype)
+    # positions stay in their own precision; _kernel_block rounds the offsets
+    mid = 0.5 * (segments_start + segments_end)
+    dl = (segments_end - segments_start).astype(dtype, copy=False)
+    sensor_points = np.asarray(sensor_points)
+
+    M = mid.shape[0]
+    N = sensor_points.shape[0]
+    currents = np.broadcast_to(np.asarray(currents, dtype=dtype), (M,))
+
+    if out is None:
+        out = np.empty((N, 3), dtype=dtype)
+    out[...] = 0.0
+
+    for n0, n1, m0, m1, K in _iter_kernel_tiles(mid, dl, sensor_points, memory_budget, dtype, kernel, cutoff):
+        out[n0:n1] += (K.reshape((-1, m1 - m0)) @ currents[m0:m1]).reshape((n1 - n0, 3))
+    return out
+
+
+def _as_currents(currents, dtype):
+    """(T,M) currents in dtype.
+
+    Below float64, magnitudes under eps^2 of the peak are flushed to 0: they
+    are far below the precision of the result, but the pulse tails otherwise
+    round to denormals, which slow the GEMM down several times.
+    """
+    currents = np.asarray(currents, dtype=dtype)
+    if dtype.itemsize < 8 and currents.size:
+        small = np.abs(currents) < np.finfo(dtype).eps ** 2 * np.abs(currents).max()
+        if small.any():
+            currents = np.where(small, dtype.type(0), currents)
+    return currents
+
+
+def _accumulate_field(mid, dl, currents, sensor_points, out, memory_budget, kernel='midpoint', cutoff=None):
+    """Add the fields of (T,M) currents at sensor_points into out (n,3,T), in out's dtype."""
+    T = currents.shape[0]
+    for n0, n1, m0, m1, K in _iter_kernel_tiles(mid, dl, sensor_points, memory_budget, out.dtype, kernel,
+                                                cutoff):
+        # one GEMM per tile: ((n*3), m) @ (m, T)
+        out[n0:n1] += (K.reshape((-1, m1 - m0)) @ currents[:, m0:m1].T).reshape((n1 - n0, 3, T))
+    return out
+
+
+def _kernel_task(arrays, lo, hi, memory_budget, kernel='midpoint'):
+    """Sensors [lo, hi) of the kernel engine, accumulated into arrays['out'] (N,3,T)."""
+    _accumulate_field(arrays['mid'], arrays['dl'], arrays['currents'], arrays['sensors'][lo:hi],
+                      arrays['out'][lo:hi], memory_budget, kernel)
+
+
+def _local_task(arrays, lo, hi, memory_budget, blocks, neighbours, kernel='midpoint', cutoff=None):
+    """Sensor blocks [lo, hi) of the cutoff engine, each against its nearby segments only."""
+    for b in range(lo, hi):
+        idx = neighbours[b]
+        if idx.size:
+            s0, s1 = blocks[b], blocks[b + 1]
+            _accumulate_field(arrays['mid'][idx], arrays['dl'][idx], arrays['currents'][:, idx],
+                              arrays['sensors'][s0:s1], arrays['out'][s0:s1], memory_budget, kernel, cutoff)
+
+
+def _direct_task(arrays, lo, hi, memory_budget, kernel='midpoint'):
+    """Timesteps [lo, hi) of the direct engine, written into arrays['out'] (N,T,3)."""
+    for ti in range(lo, hi):
+        compute_biot_savart_chunked(arrays['start'], arrays['end'], arrays['currents'][ti],
+                                    arrays['sensors'], memory_budget=memory_budget,
+                                    out=arrays['out'][:, ti, :], dtype=arrays['out'].dtype, kernel=kernel)
+
+
+# arrays attached by process-pool workers, keyed like the parent's `arrays` dict
+_WORKER_ARRAYS = {}
+
+
+def _attach_shared(specs):
+    """Process-pool initializer: map the parent's shared-memory arrays."""
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _WORKER_ARRAYS[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _process_context():
+    """Start method for process pools: forkserver where available, else spawn.
+
+    The pools are started from server threads; a forked child could inherit
+    locks that other threads held at the time.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # workers fork from a server that has imported the field code once
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def _shared_task(task, lo, hi, memory_budget):
+    arrays = {key: arr for key, (_, arr) in _WORKER_ARRAYS.items()}
+    task(arrays, lo, hi, memory_budget)
+
+
+def _wait_all(pool, futures, progress, total):
+    """Wait for futures, reporting progress(done, total) as each completes.
+
+    If a task or the progress callback raises (e.g. a cancelled job), pending
+    tasks are cancelled before the exception propagates.
+    """
+    try:
+        done = 0
+        for future in as_completed(futures):
+            future.result()
+            done += futures[future]
+            if progress is not None:
+                progress(done, total)
+    except BaseException:
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+
+
+def _run_tasks(task, arrays, n_items, memory_budget, workers=1, executor='thread', progress=None,
+               progress_parts=64):
+    """Run task over [0, n_items) split across a thread or process pool.
+
+    arrays: dict of input arrays plus the 'out' array the task writes into.
+    Process workers see every array through shared memory, so segment tables
+    are copied once rather than pickled per task.
+    progress: optional callable progress(done, total) called as blocks finish;
+      it may raise to abort the computation
+    progress_parts: number of blocks a serial run is split into when progress is watched
+    """
+    workers = max(1, int(workers))
+    if workers == 1 or n_items <= 1:
+        # a single block, unless someone wants to watch it progress
+        parts = min(n_items, progress_parts) if progress is not None else 1
+    else:
+        # use a few blocks per worker so uneven tiles still balance
+        parts = min(n_items, 4 * workers)
+    edges = np.linspace(0, n_items, max(parts, 1) + 1).astype(int)
+    ranges = [(int(lo), int(hi)) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+    if workers == 1 or n_items <= 1:
+        for lo, hi in ranges:
+            task(arrays, lo, hi, memory_budget)
+            if progress is not None:
+                progress(hi, n_items)
+        return
+
+    # keep the total scratch memory within budget
+    budget = max(1, memory_budget // workers)
+    if executor == 'thread':
+        # NumPy releases the GIL inside the ufunc and BLAS calls
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(task, arrays, lo, hi, budget): hi - lo for lo, hi in ranges}
+            _wait_all(pool, futures, progress, n_items)
+    elif executor == 'process':
+        shared = {}
+        specs = {}
+        try:
+            for key, arr in arrays.items():
+                arr = np.ascontiguousarray(arr)
+                shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                shared[key] = shm
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+                specs[key] = (shm.name, arr.shape, arr.dtype.str)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_process_context(),
+                                     initializer=_attach_shared, initargs=(specs,)) as pool:
+                futures = {pool.submit(_shared_task, task, lo, hi, budget): hi - lo for lo, hi in ranges}
+                _wait_all(pool, futures, progress, n_items)
+            _, shape, dtype = specs['out']
+            arrays['out'][...] = np.ndarray(shape, dtype=dtype, buffer=shared['out'].buf)
+        finally:
+            for shm in shared.values():
+                shm.close()
+                shm.unlink()
+    else:
+        raise ValueError(f"unknown executor {executor!r}")
+
+
+def compute_field_timeseries(segments_start, segments_end, currents, sensor_points,
+                             memory_budget=DEFAULT_MEMORY_BUDGET, workers=1, executor='thread',
+                             progress=None, kernel='midpoint', dtype=None, cutoff=None):
+    """Compute B for every timestep by linear superposition.
+
+    Builds the (N*3, M) kernel once and multiplies it with all currents in a
+    single GEMM instead of evaluating Biot-Savart per timestep. When the kernel
+    does not fit in `memory_budget` bytes it is built and applied in
+    sensor x segment tiles and accumulated.
+
+    segments_start, segments_end: arrays (M,3)
+    currents: (T,M) current magnitudes per timestep
+    sensor_points: (N,3)
+    workers: number of sensor blocks evaluated concurrently
+    executor: 'thread' or 'process' pool used when workers > 1
+    progress: optional callable progress(done, total), called as sensor blocks finish
+    kernel: 'midpoint' current elements or exact finite 'segment' field (see _kernel_block)
+    dtype: dtype of the kernel, currents, GEMM and result (default float64;
+      float32 halves memory and bandwidth). Geometry stays float64.
+    cutoff: optional radius; segments whose midpoint is farther than this
+      from a sensor are left out. Sensors are then grouped into cells of
+      that size and each cell is evaluated only against the segments a
+      KD-tree finds near it, so the cost follows the sensors' neighbourhood
+      rather than the whole population.
+
+    Returns Btime: (N,T,3)
+    """
+    dtype = np.dtype(float if dtype is None else dtype)
+    currents = _as_currents(currents, dtype)
+    T = currents.shape[0]
+    N = sensor_points.shape[0]
+    if cutoff:
+        return _field_timeseries_local(segments_start, segments_end, currents, sensor_points, cutoff,
+                                       memory_budget, workers, executor, progress, kernel)
+    arrays = {
+        'mid': 0.5 * (segments_start + segments_end),
+        'dl': (segments_end - segments_start).astype(dtype, copy=False),
+        'currents': currents,
+        'sensors': np.asarray(sensor_points, dtype=float),
+        # (N,3,T) accumulator is transposed to (N,T,3) at the end
+        'out': np.zeros((N, 3, T), dtype=dtype),
+    }
+    _run_tasks(partial(_kernel_task, kernel=kernel), arrays, N, memory_budget, workers, executor, progress)
+    return np.ascontiguousarray(arrays['out'].transpose(0, 2, 1))
+
+
+def _field_timeseries_local(segments_start, segments_end, currents, sensor_points, cutoff,
+                            memory_budget, workers, executor, progress, kernel):
+    """compute_field_timeseries with a cutoff radius, over sensor cells of side cutoff."""
+    T = currents.shape[0]
+    N = sensor_points.shape[0]
+    sensor_points = np.asarray(sensor_points, dtype=float)
+    mid = 0.5 * (segments_start + segments_end)
+
+    # sensors sorted by cell; one block per occupied cell
+    cell = np.floor(sensor_points / cutoff).astype(np.int64)
+    order = np.lexsort(cell.T[::-1])
+    cell = cell[order]
+    new_cell = np.ones(N, dtype=bool)
+    new_cell[1:] = np.any(cell[1:] != cell[:-1], axis=1)
+    blocks = np.append(np.flatnonzero(new_cell), N)
+    sensors = sensor_points[order]
+
+    # every segment within cutoff of a sensor is within cutoff + radius of its block centre
+    tree = cKDTree(mid)
+    neighbours = []
+    for s0, s1 in zip(blocks[:-1], blocks[1:]):
+        centre = sensors[s0:s1].mean(axis=0)
+        radius = np.sqrt(((sensors[s0:s1] - centre) ** 2).sum(axis=1).max())
+        neighbours.append(np.sort(np.asarray(tree.query_ball_point(centre, radius + cutoff), dtype=np.int64)))
+
+    arrays = {
+        'mid': mid,
+        'dl': (segments_end - segments_start).astype(currents.dtype, copy=False),
+        'currents': currents,
+        'sensors': sensors,
+        'out': np.zeros((N, 3, T), dtype=currents.dtype),
+    }
+    task = partial(_local_task, blocks=blocks, neighbours=neighbours, kernel=kernel, cutoff=cutoff)
+    _run_tasks(task, arrays, len(neighbours), memory_budget, workers, executor, progress)
+    Btime = np.empty((N, T, 3), dtype=currents.dtype)
+    Btime[order] = arrays['out'].transpose(0, 2, 1)
+    return Btime
+
+
+def compute_field_timeseries_direct(segments_start, segments_end, currents, sensor_points,
+                                    memory_budget=DEFAULT_MEMORY_BUDGET, workers=1, executor='thread',
+                                    progress=None, kernel='midpoint', dtype=None):
+    """Compute B for every timestep with an independent Biot-Savart evaluation each.
+
+    Same arguments as compute_field_timeseries; timesteps are split across
+    workers and progress is reported per timestep.
+
+    Returns Btime: (N,T,3)
+    """
+    dtype = np.dtype(float if dtype is None else dtype)
+    currents = _as_currents(currents, dtype)
+    T = currents.shape[0]
+    N = sensor_points.shape[0]
+    arrays = {
+        'start': np.asarray(segments_start, dtype=float),
+        'end': np.asarray(segments_end, dtype=float),
+        'currents': currents,
+        'sensors': np.asarray(sensor_points, dtype=float),
+        'out': np.zeros((N, T, 3), dtype=dtype),
+    }
+    _run_tasks(partial(_direct_task, kernel=kernel), arrays, T, memory_budget, workers, executor, progress,
+               progress_parts=T)
+    return arrays['out']
+
+
+def iter_field_frames(segments_start, segments_end, currents, sensor_points,
+                      memory_budget=DEFAULT_MEMORY_BUDGET, kernel='midpoint', dtype=None, cutoff=None):
+    """Yield (ti, B) one timestep at a time, for streaming consumers.
+
+    When the full (N*3, M) kernel fits in memory_budget it is built once and
+    each frame is a single mat-vec. Otherwise frames are computed with
+    compute_field_timeseries in chunks of 1, 2, 4, ... timesteps, so the
+    kernel tiles are shared across a chunk: the first frame costs one kernel
+    build and the whole stream about log2(T) of them.
+
+    segments_start, segments_end: arrays (M,3)
+    currents: (T,M) current magnitudes per timestep
+    sensor_points: (N,3)
+    kernel: 'midpoint' or 'segment' (see _kernel_block)
+    dtype: computation and frame dtype (default float64)
+    cutoff: optional radius beyond which segments are left out (see _kernel_block)
+
+    Yields ti, B (N,3)
+    """
+    dtype = np.dtype(float if dtype is None else dtype)
+    currents = _as_currents(currents, dtype)
+    T, M = currents.shape
+    N = sensor_points.shape[0]
+    if 9 * N * M * dtype.itemsize <= memory_budget:
+        K = biot_savart_kernel(segments_start, segments_end, sensor_points, kernel, dtype, cutoff,
+                               memory_budget).reshape((N * 3, M))
+        for ti in range(T):
+            yield ti, (K @ currents[ti]).reshape((N, 3))
+    else:
+        t0, size = 0, 1
+        while t0 < T:
+            t1 = min(T, t0 + size)
+            B = compute_field_timeseries(segments_start, segments_end, currents[t0:t1], sensor_points,
+                                         memory_budget=memory_budget, kernel=kernel, dtype=dtype, cutoff=cutoff)
+            for ti in range(t0, t1):
+                yield ti, B[:, ti - t0]
+            t0, size = t1, 2 * size
+
+
 def discretize_neuron_current(pts, tangents, waveform, current_amplitude=1.0):
     """Turn a neuron curve into segments with current values at a given time.
 
@@ -58,3 +58,63 @@ def generate_neuron_population(n_neurons=100, area=(0.0,1.0,0.0,1.0),
         pts = pts + np.array([x0, y0, z0])
         neurons.append({'pts': pts, 'tangents': tang})
     return neurons
+
+
+def generate_neuron_population_batched(n_neurons=100, area=(0.0,1.0,0.0,1.0),
+                                       z_range=(0.0,0.2), mean_length=1.0, n_points=200,
+                                       rng=None, seed_compatible=False):
+    """Batched generate_neuron_population: every curve evaluated as one array op.
+
+    seed_compatible=True draws the random numbers neuron by neuron in the
+    order of generate_neuron_population, so the same rng state gives exactly
+    the same population; otherwise each parameter is drawn for all neurons
+    at once (faster, different population for a given seed).
+
+    area = (xmin,xmax,ymin,ymax)
+    Returns dict of contiguous arrays:
+      'pts': (n_neurons, n_points, 3)
+      'tangents': (n_neurons, n_points, 3) unit tangents
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    xmin,xmax,ymin,ymax = area
+    low, high = [-0.5, -0.5, -0.0], [0.5, 0.5, 0.5]
+    if seed_compatible:
+        offset = np.empty((n_neurons, 3))
+        length = np.empty(n_neurons)
+        control = np.empty((n_neurons, 4, 3))
+        for i in range(n_neurons):
+            offset[i] = rng.uniform(xmin, xmax), rng.uniform(ymin, ymax), rng.uniform(z_range[0], z_range[1])
+            length[i] = rng.uniform(mean_length * 0.5, mean_length * 1.5)
+            control[i, 0] = rng.uniform(low, high)
+            for k in range(1, 4):
+                control[i, k] = control[i, k - 1] + rng.normal(scale=0.2, size=3)
+    else:
+        offset = rng.uniform([xmin, ymin, z_range[0]], [xmax, ymax, z_range[1]], size=(n_neurons, 3))
+        length = rng.uniform(mean_length * 0.5, mean_length * 1.5, size=n_neurons)
+        control = np.empty((n_neurons, 4, 3))
+        control[:, 0] = rng.uniform(low, high, size=(n_neurons, 3))
+        steps = rng.normal(scale=0.2, size=(n_neurons, 3, 3))
+        for k in range(1, 4):
+            control[:, k] = control[:, k - 1] + steps[:, k - 1]
+
+    # same expressions as sample_neuron_curve, broadcast over neurons
+    t = np.linspace(0.0, 1.0, n_points)
+    P0, P1, P2, P3 = (control[:, k, None, :] for k in range(4))
+    pts = (
+        ((1 - t) ** 3)[:, None] * P0
+        + 3 * ((1 - t) ** 2)[:, None] * t[:, None] * P1
+        + 3 * (1 - t)[:, None] * (t ** 2)[:, None] * P2
+        + (t ** 3)[:, None] * P3
+    )
+    tangents = np.gradient(pts, axis=1)
+    norms = np.linalg.norm(tangents, axis=2, keepdims=True)
+    norms[norms == 0] = 1.0
+    tangents = tangents / norms
+    cur_len = np.sum(np.linalg.norm(np.diff(pts, axis=1), axis=2), axis=1)
+    scale = np.ones(n_neurons)
+    positive = cur_len > 0
+    scale[positive] = length[positive] / cur_len[positive]
+    pts = pts * scale[:, None, None]
+    pts = pts + offset[:, None, :]
+    return {'pts': np.ascontiguousarray(pts), 'tangents': np.ascontiguousarray(tangents)}
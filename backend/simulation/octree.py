@@ -0,0 +1,188 @@
+import numpy as np
+
+from .field import DEFAULT_MEMORY_BUDGET, MU0, _accumulate_field
+
+
+def build_segment_octree(segments_start, segments_end, leaf_size=64, max_depth=16):
+    """Build an octree over current segments for Barnes-Hut field evaluation.
+
+    Segments are reordered so every node covers a contiguous slice [lo, hi) of
+    the permuted arrays.
+
+    segments_start, segments_end: arrays (M,3)
+    leaf_size: maximum number of segments in a leaf
+    max_depth: depth limit (guards against coincident segments)
+
+    Returns dict with
+      'order': (M,) permutation from original to tree order
+      'mid', 'dl': (M,3) midpoints and direction vectors in tree order
+      'lo', 'hi': (K,) segment slice of each node
+      'children': list of K tuples of child node ids (empty for leaves)
+      'centre': (K,3) |dl|-weighted centroid used as expansion centre
+      'size': (K,) radius of the node's segments around its centre
+    """
+    mid = 0.5 * (segments_start + segments_end)
+    dl = segments_end - segments_start
+    M = mid.shape[0]
+    order = np.arange(M)
+
+    lows, highs, children = [], [], []
+
+    def new_node(lo, hi):
+        lows.append(lo)
+        highs.append(hi)
+        children.append(())
+        return len(lows) - 1
+
+    box_lo = mid.min(axis=0) if M else np.zeros(3)
+    box_hi = mid.max(axis=0) if M else np.zeros(3)
+    root = new_node(0, M)
+    stack = [(root, 0.5 * (box_lo + box_hi), 0.5 * np.max(box_hi - box_lo), 0)]
+    signs = np.array([[(k >> b) & 1 for b in range(3)] for k in range(8)]) * 2.0 - 1.0
+    while stack:
+        node, box_centre, half, depth = stack.pop()
+        lo, hi = lows[node], highs[node]
+        if hi - lo <= leaf_size or depth >= max_depth:
+            continue
+        # octant code per segment midpoint, then stable sort the slice by it
+        idx = order[lo:hi]
+        code = ((mid[idx] > box_centre) * np.array([1, 2, 4])).sum(axis=1)
+        order[lo:hi] = idx[np.argsort(code, kind='stable')]
+        offsets = lo + np.concatenate([[0], np.cumsum(np.bincount(code, minlength=8))])
+        kids = []
+        for octant in range(8):
+            c_lo, c_hi = int(offsets[octant]), int(offsets[octant + 1])
+            if c_hi > c_lo:
+                child = new_node(c_lo, c_hi)
+                kids.append(child)
+                stack.append((child, box_centre + 0.5 * half * signs[octant], 0.5 * half, depth + 1))
+        children[node] = tuple(kids)
+
+    mid = mid[order]
+    dl = dl[order]
+    start = mid - 0.5 * dl
+    end = mid + 0.5 * dl
+    weight = np.linalg.norm(dl, axis=1)
+
+    K = len(lows)
+    centre = np.empty((K, 3))
+    size = np.empty(K)
+    for node in range(K):
+        lo, hi = lows[node], highs[node]
+        w = weight[lo:hi]
+        if hi > lo and w.sum() > 0:
+            centre[node] = (w[:, None] * mid[lo:hi]).sum(axis=0) / w.sum()
+        else:
+            centre[node] = mid[lo:hi].mean(axis=0) if hi > lo else 0.0
+        if hi > lo:
+            size[node] = max(np.linalg.norm(start[lo:hi] - centre[node], axis=1).max(),
+                             np.linalg.norm(end[lo:hi] - centre[node], axis=1).max())
+        else:
+            size[node] = 0.0
+
+    return {
+        'order': order,
+        'mid': mid,
+        'dl': dl,
+        'lo': np.array(lows, dtype=np.int64),
+        'hi': np.array(highs, dtype=np.int64),
+        'children': children,
+        'centre': centre,
+        'size': size,
+    }
+
+
+def _node_moments(tree, node, currents):
+    """Current moments of a node for every timestep.
+
+    currents: (T,M) in tree order
+    Returns Q (T,3) = sum I dl, D (T,3,3) = sum I dl (x) (mid - centre)
+    """
+    lo, hi = tree['lo'][node], tree['hi'][node]
+    dl = tree['dl'][lo:hi]
+    d = tree['mid'][lo:hi] - tree['centre'][node]
+    I = currents[:, lo:hi]
+    Q = I @ dl
+    D = (I @ (dl[:, :, None] * d[:, None, :]).reshape((-1, 9))).reshape((-1, 3, 3))
+    return Q, D
+
+
+def _far_field(Q, D, R, order):
+    """Multipole field of an aggregated node at offsets R (n,3) from its centre.
+
+    Expands sum_m I_m dl_m x (R - d_m)/|R - d_m|^3 to first order in d_m.
+    Returns (n,3,T)
+    """
+    coeff = MU0 / (4 * np.pi)
+    r2 = np.einsum('ni,ni->n', R, R)
+    inv_r3 = coeff / (r2 * np.sqrt(r2))
+    # leading term: aggregated current element Q x R / |R|^3
+    B = np.cross(Q[None, :, :], R[:, None, :]) * inv_r3[:, None, None]  # (n,T,3)
+    if order >= 1:
+        # dipole correction: -(sum dl x d)/|R|^3 + 3 (D R) x R / |R|^5
+        A = np.stack([D[:, 1, 2] - D[:, 2, 1],
+                      D[:, 2, 0] - D[:, 0, 2],
+                      D[:, 0, 1] - D[:, 1, 0]], axis=1)  # (T,3)
+        DR = np.einsum('tij,nj->nti', D, R)  # (n,T,3)
+        B -= A[None, :, :] * inv_r3[:, None, None]
+        B += 3 * np.cross(DR, R[:, None, :]) * (inv_r3 / r2)[:, None, None]
+    return B.transpose(0, 2, 1)
+
+
+def compute_field_timeseries_octree(segments_start, segments_end, currents, sensor_points,
+                                    theta=0.5, leaf_size=64, order=1, tree=None,
+                                    memory_budget=DEFAULT_MEMORY_BUDGET, progress=None, kernel='midpoint'):
+    """Approximate B for every timestep with a Barnes-Hut traversal.
+
+    A node is aggregated into a multipole (current moment plus first-order
+    correction) for a sensor when size / distance < theta; otherwise its
+    children are visited, and leaves are summed exactly. theta=0 is exact.
+
+    segments_start, segments_end: arrays (M,3)
+    currents: (T,M) current magnitudes per timestep
+    sensor_points: (N,3)
+    theta: opening angle; smaller is more accurate and slower
+    order: 0 for the aggregated current element only, 1 to add the dipole term
+    tree: optional prebuilt build_segment_octree result for the same segments
+    progress: optional callable progress(done, total) over resolved sensor x segment pairs
+    kernel: 'midpoint' or exact 'segment' kernel for the leaves summed directly
+
+    Returns Btime: (N,T,3)
+    """
+    if tree is None:
+        tree = build_segment_octree(segments_start, segments_end, leaf_size=leaf_size)
+    currents = np.asarray(currents, dtype=float)[:, tree['order']]
+    T = currents.shape[0]
+    N = sensor_points.shape[0]
+    B = np.zeros((N, 3, T), dtype=float)
+    total = N * currents.shape[1]
+    done = 0
+
+    stack = [(0, np.arange(N))]
+    while stack:
+        if progress is not None:
+            progress(done, total)
+        node, idx = stack.pop()
+        if idx.size == 0 or tree['hi'][node] == tree['lo'][node]:
+            continue
+        R = sensor_points[idx] - tree['centre'][node]
+        far = tree['size'][node] < theta * np.linalg.norm(R, axis=1)
+        if far.any():
+            Q, D = _node_moments(tree, node, currents)
+            B[idx[far]] += _far_field(Q, D, R[far], order)
+            done += int(far.sum()) * int(tree['hi'][node] - tree['lo'][node])
+        near = idx[~far]
+        if near.size == 0:
+            continue
+        if tree['children'][node]:
+            stack.extend((child, near) for child in tree['children'][node])
+        else:
+            lo, hi = tree['lo'][node], tree['hi'][node]
+            acc = np.zeros((near.size, 3, T))
+            _accumulate_field(tree['mid'][lo:hi], tree['dl'][lo:hi], currents[:, lo:hi],
+                              sensor_points[near], acc, memory_budget, kernel)
+            B[near] += acc
+            done += near.size * int(hi - lo)
+    if progress is not None:
+        progress(total, total)
+    return np.ascontiguousarray(B.transpose(0, 2, 1))
@@ -0,0 +1,187 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def pack_neuron_segments(neurons):
+    """Flatten a neuron population into a single packed segment table.
+
+    neurons: list of dicts with 'pts' (L,3) as returned by generate_neuron_population,
+      or a packed population {'pts': (n_neurons,L,3)} from generate_neuron_population_batched
+
+    Returns dict of contiguous arrays, one row per segment (M total):
+      'start', 'end', 'dl': (M,3) segment endpoints and direction vectors
+      's0', 's1': (M,) curve parameter in [0,1] at the segment endpoints
+      'neuron_id': (M,) index of the owning neuron
+    """
+    if isinstance(neurons, dict):
+        pts = neurons['pts']
+        n, L = pts.shape[:2]
+        s = np.linspace(0.0, 1.0, L)
+        start = np.ascontiguousarray(pts[:, :-1].reshape((-1, 3)))
+        end = np.ascontiguousarray(pts[:, 1:].reshape((-1, 3)))
+        return {
+            'start': start,
+            'end': end,
+            'dl': end - start,
+            's0': np.tile(s[:-1], n),
+            's1': np.tile(s[1:], n),
+            'neuron_id': np.repeat(np.arange(n, dtype=np.int32), L - 1),
+        }
+
+    starts, ends, s0, s1, ids = [], [], [], [], []
+    for i, neuron in enumerate(neurons):
+        pts = neuron['pts']
+        L = pts.shape[0]
+        s = np.linspace(0.0, 1.0, L)
+        starts.append(pts[:-1])
+        ends.append(pts[1:])
+        s0.append(s[:-1])
+        s1.append(s[1:])
+        ids.append(np.full(L - 1, i, dtype=np.int32))
+
+    start = np.ascontiguousarray(np.concatenate(starts, axis=0))
+    end = np.ascontiguousarray(np.concatenate(ends, axis=0))
+    return {
+        'start': start,
+        'end': end,
+        'dl': end - start,
+        's0': np.concatenate(s0),
+        's1': np.concatenate(s1),
+        'neuron_id': np.concatenate(ids),
+    }
+
+
+def segment_currents(table, times, velocity=0.5, sigma=0.05, current_amplitude=1.0):
+    """Evaluate the moving Gaussian pulse on every segment for every timestep.
+
+    The pulse centre travels along each curve at `velocity` (curve-units / second)
+    and wraps at the end. Point waveforms are averaged onto segments exactly like
+    discretize_neuron_current does.
+
+    table: packed segment table from pack_neuron_segments
+    times: (T,) time points
+
+    Returns currents: (T,M)
+    """
+    times = np.asarray(times, dtype=float)
+    center = (times * velocity) % 1.0
+
+    # all neurons usually share the same parameter grid, so evaluate the
+    # waveform once per distinct parameter value and gather onto segments
+    s_all = np.concatenate([table['s0'], table['s1']])
+    s_unique, inverse = np.unique(s_all, return_inverse=True)
+    waveform = np.exp(-0.5 * ((s_unique[None, :] - center[:, None]) ** 2) / (sigma ** 2))
+
+    M = table['s0'].shape[0]
+    w0 = waveform[:, inverse[:M]]
+    w1 = waveform[:, inverse[M:]]
+    return current_amplitude * (0.5 * (w0 + w1))
+
+
+def coarsen_segments(table, sensor_points, tol=0.5, max_ds=None):
+    """Merge consecutive segments of each neuron into chords where sensors are far away.
+
+    A run of segments is merged while its arc length stays below
+    tol * (distance from the run to the nearest sensor), so segments near
+    the sensors keep full resolution and distant ones become long chords. Pair with the exact finite-segment kernel (kernel='segment'),
+    whose error then depends only on how well a chord follows the curve.
+
+    table: packed segment table from pack_neuron_segments (segments of a
+      neuron contiguous and in curve order)
+    sensor_points: (N,3)
+    tol: maximum arc length / distance ratio of a merged segment
+
+    Returns a packed segment table of the merged segments with one extra
+    entry 'fine_start': (Mc,) index of the first original segment of each,
+    for coarsen_currents.
+    """
+    M = table['start'].shape[0]
+    if M == 0:
+        return _merged_table(table, np.zeros(0, dtype=bool))
+    # distance of every segment endpoint to its nearest sensor
+    tree = cKDTree(sensor_points)
+    dist = np.minimum(tree.query(table['start'])[0], tree.query(table['end'])[0])
+    length = np.linalg.norm(table['dl'], axis=1)
+
+    # position of each segment within its neuron; walk all neurons in lockstep
+    first, run_id, pos = _segment_positions(table)
+
+    breaks = first.copy()
+    arc = np.zeros(run_id[-1] + 1)
+    nearest = np.full(arc.shape, np.inf)
+    s_begin = np.zeros(arc.shape)
+    order = np.argsort(pos, kind='stable')
+    bounds = np.searchsorted(pos[order], np.arange(pos.max() + 2))
+    for k in range(len(bounds) - 1):
+        idx = order[bounds[k]:bounds[k + 1]]
+        runs = run_id[idx]
+        new_arc = arc[runs] + length[idx]
+        new_ds = table['s1'][idx] - s_begin[runs]
+        new_nearest = np.minimum(nearest[runs], dist[idx])
+        # start a new merged segment when extending would break the distance rule
+        cut = first[idx] | (new_arc > tol * new_nearest)
+        if max_ds is not None:
+            cut |= new_ds > max_ds
+        breaks[idx] = cut
+        arc[runs] = np.where(cut, length[idx], new_arc)
+        nearest[runs] = np.where(cut, dist[idx], new_nearest)
+        s_begin[runs] = np.where(cut, table['s0'][idx], s_begin[runs])
+    return _merged_table(table, breaks)
+
+
+def decimate_segments(table, factor):
+    """Merge every `factor` consecutive segments of each neuron into one chord.
+
+    A uniform, sensor-independent coarsening for quick previews; the result
+    has the same layout as coarsen_segments (including 'fine_start'), so
+    coarsen_currents applies to it.
+    """
+    if table['start'].shape[0] == 0:
+        return _merged_table(table, np.zeros(0, dtype=bool))
+    _, _, pos = _segment_positions(table)
+    return _merged_table(table, pos % max(1, int(factor)) == 0)
+
+
+def _segment_positions(table):
+    """first (segment starts a neuron), run_id (neuron run) and position within it, per segment."""
+    neuron_id = table['neuron_id']
+    M = neuron_id.shape[0]
+    first = np.ones(M, dtype=bool)
+    first[1:] = neuron_id[1:] != neuron_id[:-1]
+    run_id = np.cumsum(first) - 1
+    pos = np.arange(M) - np.flatnonzero(first)[run_id]
+    return first, run_id, pos
+
+
+def _merged_table(table, breaks):
+    """Packed table of chords, one starting at each segment where breaks is set."""
+    M = table['start'].shape[0]
+    fine_start = np.flatnonzero(breaks)
+    fine_end = np.append(fine_start[1:], M) - 1
+    start = np.ascontiguousarray(table['start'][fine_start])
+    end = np.ascontiguousarray(table['end'][fine_end])
+    return {
+        'start': start,
+        'end': end,
+        'dl': end - start,
+        's0': table['s0'][fine_start],
+        's1': table['s1'][fine_end],
+        'neuron_id': table['neuron_id'][fine_start],
+        'fine_start': fine_start,
+    }
+
+
+def coarsen_currents(table, coarse, currents):
+    """Currents of merged segments: the length-weighted mean of the originals.
+
+    table: the fine table passed to coarsen_segments
+    coarse: its result
+    currents: (T,M) currents of the fine segments
+
+    Returns (T,Mc)
+    """
+    length = np.linalg.norm(table['dl'], axis=1)
+    weighted = np.add.reduceat(currents * length, coarse['fine_start'], axis=1)
+    total = np.add.reduceat(length, coarse['fine_start'])
+    total[total == 0] = 1.0
+    return weighted / total
@@ -0,0 +1,128 @@
+import asyncio
+import struct
+import threading
+import traceback
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from formats import encode_raw
+from pipeline import progressive_levels, simulate_frames
+
+FRAMES_MEDIA_TYPE = 'application/x-lucerna-frames'
+
+# frames a WebSocket producer may run ahead of a slow client
+MAX_BUFFERED_FRAMES = 4
+
+
+def frame_messages(req, quantity='B'):
+    """Yield binary messages for a streamed simulation.
+
+    The first message is a header-only raw frame (formats.encode_raw) with the
+    coordinates and frame shape; each following message is one raw frame
+    holding `quantity` for a single timestep plus its t_index and time.
+
+    quantity: 'B' for the (N_sensors, 3) field or 'df' for the (N_sensors,)
+      clean frequency shift (projected on z and scaled by req.signal_scale)
+    """
+    frames = simulate_frames(req)
+    _, geom = next(frames)
+    xs, ys, times = geom['xs'], geom['ys'], geom['times']
+    n_sensors = geom['sensor_points'].shape[0]
+    frame_shape = [n_sensors, 3] if quantity == 'B' else [n_sensors]
+    yield encode_raw({}, {'xs': xs.tolist(), 'ys': ys.tolist(), 'times': times.tolist(),
+                          'quantity': quantity, 'frame_shape': frame_shape, 'n_frames': int(times.size)})
+    for ti, B in frames:
+        frame = B if quantity == 'B' else req.signal_scale * B[:, 2]
+        yield encode_raw({quantity: frame}, {'t_index': int(ti), 'time': float(times[ti])})
+
+
+def progressive_messages(req, quantity='B', target_ms=100):
+    """Yield one binary message per refinement level of pipeline.progressive_levels.
+
+    Each message is a raw frame holding `quantity` for the whole level,
+    (N_level, T_level, 3) for 'B' or (N_level, T_level) for 'df', with the
+    level's xs, ys, times and refinement info in its metadata. The last
+    message ('level' == 'n_levels' - 1) is the full-resolution result;
+    'exact' is true only there, and only for an exact engine.
+    """
+    for result in progressive_levels(req, target_ms=target_ms):
+        B = result['Btime']
+        data = B if quantity == 'B' else req.signal_scale * B[..., 2]
+        meta = {name: result[name] for name in ('level', 'n_levels', 'stride', 'time_step', 'segment_factor', 'exact')}
+        yield encode_raw({quantity: data}, dict(meta, xs=result['xs'].tolist(), ys=result['ys'].tolist(),
+                                                times=result['times'].tolist(), quantity=quantity,
+                                                elapsed_ms=1000 * result['elapsed']))
+
+
+def length_prefixed(messages):
+    """Prefix each message with its uint32 LE length for a plain HTTP byte stream.
+
+    Starlette pulls the next message only after the previous one has been
+    sent, so a slow client throttles the computation instead of buffering it.
+    The response has already started when a message fails, so the error is
+    logged to backend_error.log (as for WebSocket streams) and the stream
+    is cut short.
+    """
+    try:
+        for msg in messages:
+            yield struct.pack('<I', len(msg)) + msg
+    except Exception:
+        with open('backend_error.log', 'a', encoding='utf-8') as f:
+            f.write('\n--- STREAM ERROR ---\n')
+            f.write(traceback.format_exc())
+        raise
+
+
+async def websocket_stream(websocket: WebSocket, messages, max_buffered=MAX_BUFFERED_FRAMES):
+    """Send messages over a WebSocket while they are produced on a worker thread.
+
+    At most max_buffered messages wait in memory: the producer blocks when the
+    queue is full and stops as soon as the client disconnects.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_buffered)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # block this worker thread until the queue has room or the client is gone
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except FutureTimeout:
+                if stop.is_set():
+                    future.cancel()
+                    return
+
+    def produce():
+        try:
+            for msg in messages:
+                if stop.is_set():
+                    return
+                put(msg)
+        except Exception as e:
+            with open('backend_error.log', 'a', encoding='utf-8') as f:
+                f.write('\n--- STREAM ERROR ---\n')
+                f.write(traceback.format_exc())
+            put(e)
+        finally:
+            put(done)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                await websocket.close(code=1011, reason='Simulation failed; logged backend_error.log')
+                return
+            await websocket.send_bytes(item)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stop.set()
+        await producer
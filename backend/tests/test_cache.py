@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from cache import StageCache
+
+
+def entry(i, n=1000):
+    return {'a': np.full(n, float(i))}
+
+
+def disk_keys(path):
+    return {name for name in os.listdir(path) if not name.startswith('.')}
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    # each entry is 8000 bytes of data plus a small .npy header
+    cache = StageCache(max_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=3 * 8200)
+    for i in range(3):
+        cache.put('s', {'i': i}, entry(i))
+    assert len(disk_keys(tmp_path)) == 3
+    # a disk hit makes entry 0 the most recently used, so entry 1 goes first
+    assert cache.get('s', {'i': 0})['a'][0] == 0.0
+    cache.put('s', {'i': 3}, entry(3))
+    assert disk_keys(tmp_path) == {cache.key('s', {'i': i}) for i in (0, 2, 3)}
+    assert cache.get('s', {'i': 1}) is None
+    stats = cache.stats()
+    assert stats['disk_entries'] == 3 and stats['disk_evictions'] == 1
+    assert stats['disk_bytes'] <= stats['max_disk_bytes']
+
+
+def test_disk_budget_applies_to_existing_entries(tmp_path):
+    cache = StageCache(max_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=10 ** 9)
+    for i in range(4):
+        cache.put('s', {'i': i}, entry(i))
+    # a restarted server with a smaller budget trims the directory
+    cache = StageCache(max_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=2 * 8200)
+    assert len(disk_keys(tmp_path)) == 2
+    assert cache.stats()['disk_bytes'] <= 2 * 8200
+
+
+def test_entry_larger_than_disk_budget_is_not_written(tmp_path):
+    cache = StageCache(max_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=100)
+    cache.put('s', {}, entry(0))
+    assert disk_keys(tmp_path) == set()
+
+
+def test_evicted_entry_stays_readable_while_mapped(tmp_path):
+    cache = StageCache(max_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=8200)
+    cache.put('s', {'i': 0}, entry(0))
+    mapped = cache.get('s', {'i': 0})['a']
+    cache.put('s', {'i': 1}, entry(1))
+    assert cache.get('s', {'i': 0}) is None
+    assert np.all(mapped == 0.0)
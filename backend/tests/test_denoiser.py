@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from denoiser import laplacian_smoothing, stencil_smoothing
+from graph import edge_adjacency, spatiotemporal_edges
+
+
+@pytest.mark.parametrize('spatial_threshold, temporal_threshold', [(0.15, 1), (0.45, 2), (0.0, 1), (0.3, 0)])
+def test_stencil_smoothing_matches_sparse(spatial_threshold, temporal_threshold):
+    xs = ys = np.linspace(0.0, 1.0, 6)
+    df = np.random.default_rng(2).normal(size=(36, 8))
+    coo = spatiotemporal_edges(xs, ys, 36, 8, spatial_threshold, temporal_threshold)
+    adj = edge_adjacency(coo['source'], coo['target'], coo['weight'], 36 * 8)
+    sparse = laplacian_smoothing(df, adj, n_iters=3, alpha=0.3)
+    stencil = stencil_smoothing(df, xs, ys, n_iters=3, alpha=0.3, spatial_threshold=spatial_threshold,
+                                temporal_threshold=temporal_threshold)
+    np.testing.assert_allclose(stencil, sparse, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,23 @@
+import numpy as np
+
+from pipeline import prepare_geometry
+from server import SimRequest
+from simulation.field import compute_field_timeseries
+from simulation.fft import compute_field_timeseries_fft
+
+
+def test_fft_close_to_kernel():
+    geom = prepare_geometry(SimRequest(n_neurons=20, sensor_res=24, n_time=6))
+    table = geom['table']
+    ref = compute_field_timeseries(table['start'], table['end'], geom['currents'], geom['sensor_points'])
+    B = compute_field_timeseries_fft(table['start'], table['end'], geom['currents'], geom['xs'], geom['ys'])
+    assert np.linalg.norm(B - ref) / np.linalg.norm(ref) < 5e-3
+
+
+def test_fft_time_chunks_match():
+    geom = prepare_geometry(SimRequest(n_neurons=10, sensor_res=16, n_time=5))
+    table = geom['table']
+    args = (table['start'], table['end'], geom['currents'], geom['xs'], geom['ys'])
+    # a tiny budget processes one timestep at a time
+    assert np.allclose(compute_field_timeseries_fft(*args, memory_budget=1), compute_field_timeseries_fft(*args),
+                       rtol=1e-12, atol=1e-20)
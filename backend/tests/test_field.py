@@ -0,0 +1,19 @@
+import threading
+
+import numpy as np
+
+from pipeline import STAGE_CACHE, _simulate
+from server import SimRequest
+
+
+def test_process_pool_from_a_thread_matches_serial():
+    # the server runs pipelines on worker threads; process pools must not fork from them
+    base = dict(n_neurons=10, sensor_res=12, n_time=8)
+    serial = _simulate(SimRequest(**base))['Btime']
+    STAGE_CACHE.clear()
+    out = {}
+    thread = threading.Thread(target=lambda: out.update(
+        B=_simulate(SimRequest(**base, workers=2, executor='process'))['Btime']))
+    thread.start()
+    thread.join()
+    np.testing.assert_allclose(out['B'], serial, rtol=1e-12, atol=1e-30)
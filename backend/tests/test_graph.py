@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from graph import spatiotemporal_edges
+
+
+def reference_edges(xs, ys, n_sensors, n_times, spatial_threshold, temporal_threshold):
+    """The original O(V^2) pairwise edge loop of build_spatiotemporal_graph."""
+    n_xy = len(xs)
+    nodes = [{'id': t_idx * n_sensors + i, 'time_idx': t_idx, 'x': float(xs[i // n_xy]), 'y': float(ys[i % n_xy])}
+             for t_idx in range(n_times) for i in range(n_sensors)]
+    edges = []
+    for n1 in nodes:
+        for n2 in nodes:
+            if n1['id'] >= n2['id']:
+                continue
+            dx = n1['x'] - n2['x']
+            dy = n1['y'] - n2['y']
+            spatial_dist = np.sqrt(dx*dx + dy*dy)
+            time_diff = abs(n1['time_idx'] - n2['time_idx'])
+            if spatial_dist < spatial_threshold and time_diff <= temporal_threshold:
+                weight = 1.0 / (spatial_dist + 0.01) * np.exp(-time_diff)
+                edges.append((n1['id'], n2['id'], float(weight), float(spatial_dist), int(time_diff)))
+    return edges
+
+
+XS, YS, T = np.linspace(0.0, 1.0, 5), np.linspace(0.0, 0.6, 5), 4
+DIAGONAL = float(np.sqrt(0.25 * 0.25 + 0.15 * 0.15))
+
+
+# 0.25 and DIAGONAL are exact sensor distances, so those pairs sit on the (exclusive) threshold
+@pytest.mark.parametrize('spatial_threshold', [0.0, 0.15, 0.25, DIAGONAL, 0.4])
+@pytest.mark.parametrize('temporal_threshold', [0, 1, T - 1, T, T + 3])
+def test_edges_match_pairwise_loop(spatial_threshold, temporal_threshold):
+    N = len(XS) * len(YS)
+    coo = spatiotemporal_edges(XS, YS, N, T, spatial_threshold, temporal_threshold)
+    edges = list(zip(coo['source'].tolist(), coo['target'].tolist(), coo['weight'].tolist(),
+                     coo['spatial_dist'].tolist(), coo['time_diff'].tolist()))
+    assert edges == reference_edges(XS, YS, N, T, spatial_threshold, temporal_threshold)
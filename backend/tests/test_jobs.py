@@ -0,0 +1,54 @@
+import sys
+import time
+
+import numpy as np
+
+from jobs import JobManager, result_nbytes
+
+
+def wait(manager, jobs):
+    for _ in range(500):
+        if all(job.status not in ('queued', 'running') for job in jobs):
+            return
+        time.sleep(0.01)
+    raise AssertionError('jobs did not finish')
+
+
+def test_results_stay_within_byte_budget():
+    manager = JobManager(max_running=1, max_result_bytes=3 * result_nbytes({'a': np.zeros(1000)}))
+    jobs = []
+    for i in range(5):
+        jobs.append(manager.submit('test', {}, lambda progress, i=i: {'a': np.full(1000, float(i))}))
+        wait(manager, jobs)
+        assert manager.result_bytes <= manager.max_result_bytes
+    assert [job.status for job in jobs] == ['expired', 'expired', 'done', 'done', 'done']
+    assert jobs[0].result is None and jobs[0].info()['error']
+    assert jobs[4].result['a'][0] == 4.0
+
+
+def test_result_larger_than_budget_expires():
+    manager = JobManager(max_result_bytes=100)
+    job = manager.submit('test', {}, lambda progress: {'a': np.zeros(1000)})
+    wait(manager, [job])
+    assert job.status == 'expired' and manager.result_bytes == 0
+
+
+def test_record_lists_count_towards_result_bytes():
+    nodes = [{'x': float(i), 'y': 0.0, 't': 1.0} for i in range(100)]
+    assert result_nbytes({'nodes': nodes}) > 100 * sys.getsizeof(nodes[0])
+
+
+def test_graph_job_keeps_only_response_fields():
+    from fastapi.testclient import TestClient
+
+    import server
+
+    client = TestClient(server.app)
+    for layout in ('records', 'columnar'):
+        r = client.post('/jobs/graph', json={'n_neurons': 5, 'sensor_res': 8, 'n_time': 4, 'layout': layout})
+        job = server.JOBS.get(r.json()['job_id'])
+        wait(server.JOBS, [job])
+        assert job.status == 'done'
+        assert not {'table', 'sensor_points', 'Btime', 'df_clean'} & set(job.result)
+        assert job.result_bytes > 0
+        assert client.get(f"/jobs/{job.id}/result").status_code == 200
@@ -0,0 +1,11 @@
+import numpy as np
+
+from simulation.neuron import generate_neuron_population, generate_neuron_population_batched
+
+
+def test_seed_compatible_batched_population_matches_per_neuron():
+    kwargs = dict(n_neurons=7, area=(0.0, 2.0, -1.0, 1.0), z_range=(0.1, 0.3), mean_length=0.5)
+    neurons = generate_neuron_population(rng=np.random.default_rng(3), **kwargs)
+    batched = generate_neuron_population_batched(rng=np.random.default_rng(3), seed_compatible=True, **kwargs)
+    assert np.array_equal(batched['pts'], np.stack([n['pts'] for n in neurons]))
+    assert np.array_equal(batched['tangents'], np.stack([n['tangents'] for n in neurons]))
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from odmr import NoiseModel
+
+
+def reference_add_noise(df, noise_level=0.1, shot_noise=False, thermal_std=0.0, drift_std=0.0, rng=None):
+    """The original add_noise, before it was built on NoiseModel."""
+    df = df.astype(float)
+    maxv = max(1.0, np.max(np.abs(df)))
+    gauss_std = noise_level * maxv
+    noisy = df + rng.normal(scale=gauss_std, size=df.shape)
+    if shot_noise:
+        shot = rng.normal(scale=np.sqrt(np.abs(df) + 1e-6))
+        noisy += shot * (noise_level * 0.5)
+    if thermal_std and thermal_std > 0.0:
+        noisy += rng.normal(scale=thermal_std, size=df.shape)
+    if drift_std and drift_std > 0.0:
+        N, T = df.shape
+        drift = rng.normal(scale=drift_std, size=(N,))[:, None] * np.linspace(0.0, 1.0, T)[None, :]
+        noisy += drift
+    return noisy
+
+
+@pytest.mark.parametrize('options', [{}, {'shot_noise': True, 'thermal_std': 0.05, 'drift_std': 0.2}])
+def test_noise_model_matches_add_noise(options):
+    df = np.random.default_rng(1).normal(scale=3.0, size=(12, 10))
+    model = NoiseModel(df.shape, noise_level=0.2, **options)
+    noisy = model.apply(df, rng=np.random.default_rng(5))
+    assert np.array_equal(noisy, reference_add_noise(df, noise_level=0.2, rng=np.random.default_rng(5), **options))
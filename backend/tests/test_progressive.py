@@ -0,0 +1,38 @@
+import numpy as np
+
+from pipeline import STAGE_CACHE, _simulate, progressive_levels
+from server import SimRequest
+
+
+def levels(**kw):
+    STAGE_CACHE.clear()
+    req = SimRequest(**dict(dict(n_neurons=10, sensor_res=32, n_time=20), **kw))
+    out = list(progressive_levels(req, target_ms=1000))
+    STAGE_CACHE.clear()
+    return req, out
+
+
+def test_final_level_equals_simulate():
+    for engine in ('kernel', 'direct'):
+        req, out = levels(engine=engine)
+        assert len(out) > 1
+        assert np.array_equal(out[-1]['Btime'], _simulate(req)['Btime'])
+        assert [level['exact'] for level in out] == [False] * (len(out) - 1) + [True]
+
+
+def test_approximate_engines_are_never_exact():
+    for kw in (dict(engine='fft'), dict(engine='octree'), dict(cutoff=0.3)):
+        req, out = levels(**kw)
+        assert len(out) > 1
+        assert not any(level['exact'] for level in out)
+        assert np.allclose(out[-1]['Btime'], _simulate(req)['Btime'], rtol=0, atol=1e-12 * np.abs(out[-1]['Btime']).max())
+
+
+def test_cached_request_yields_final_level():
+    req = SimRequest(n_neurons=5, sensor_res=16, n_time=4)
+    STAGE_CACHE.clear()
+    expected = list(progressive_levels(req))[-1]
+    cached = list(progressive_levels(req))
+    STAGE_CACHE.clear()
+    assert len(cached) == 1 and cached[0]['exact']
+    assert np.array_equal(cached[0]['Btime'], expected['Btime'])
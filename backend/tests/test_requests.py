@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from pipeline import n_sensors, sensor_grid
+from server import SimRequest, app
+
+client = TestClient(app)
+BASE = {'n_neurons': 5, 'sensor_res': 8, 'n_time': 4}
+
+
+def test_malformed_sensor_selection_is_422():
+    for body in ({'roi': ['a', 'b', 'c', 'd']}, {'roi': [0.0, 1.0, 0.0]}, {'sensors': [['a', 0.0]]},
+                 {'sensors': [0.5, 0.5]}, {'sensors': [[0.5]]}, {'roi': [2.0, 3.0, 2.0, 3.0]}):
+        r = client.post('/simulate', json={**BASE, **body})
+        assert r.status_code == 422, body
+
+
+def test_n_sensors_matches_sensor_grid():
+    for fields in ({}, {'stride': 3}, {'roi': [0.2, 0.7, 0.0, 0.5]}, {'roi': [2.0, 3.0, 2.0, 3.0]},
+                   {'sensors': [[0.5, 0.5], [0.1, 0.2, 0.3]]}):
+        req = SimRequest.model_construct(**{**SimRequest().model_dump(), **BASE, **fields})
+        assert n_sensors(req) == sensor_grid(req)[2].shape[0]
@@ -0,0 +1,39 @@
+import numpy as np
+
+from pipeline import build_geometry
+from server import SimRequest
+from simulation.field import discretize_neuron_current
+from simulation.neuron import generate_neuron_population
+from simulation.segments import coarsen_segments, pack_neuron_segments, segment_currents
+
+
+def test_coarsening_follows_nearest_sensor():
+    # a straight neuron at the sensor plane, midway between two sensors far apart:
+    # inside their bounding box, but 0.35 or more from either of them
+    pts = np.stack([np.linspace(0.25, 0.75, 201), np.linspace(0.75, 0.25, 201), np.zeros(201)], axis=1)
+    table = pack_neuron_segments([{'pts': pts}])
+    sensors = np.array([[0.0, 0.0, 0.0], [1.0, 1.0, 0.0]])
+    counts = [coarsen_segments(table, sensors, tol=tol)['start'].shape[0] for tol in (0.1, 0.5, 2.0)]
+    assert counts[0] > counts[1] > counts[2]
+    assert counts[0] < table['start'].shape[0] / 10
+
+
+def test_tol_changes_count_at_fixed_max_ds():
+    geom = build_geometry(SimRequest(n_neurons=40, sensor_res=16))
+    table, sensors = geom['fine_table'], geom['sensor_points']
+    counts = [coarsen_segments(table, sensors, tol=tol, max_ds=0.05)['start'].shape[0] for tol in (0.05, 0.5, 4.0)]
+    assert counts[0] > counts[1] > counts[2]
+
+
+def test_segment_currents_match_discretize_neuron_current():
+    # the original per-neuron, per-timestep pulse of /simulate
+    neurons = generate_neuron_population(n_neurons=4, mean_length=0.5, rng=np.random.default_rng(0))
+    times = np.linspace(0.0, 3.0, 9)
+    currents = segment_currents(pack_neuron_segments(neurons), times)
+    for ti, t in enumerate(times):
+        expected = []
+        for neuron in neurons:
+            s = np.linspace(0.0, 1.0, neuron['pts'].shape[0])
+            waveform = np.exp(-0.5 * ((s - (t * 0.5) % 1.0) ** 2) / (0.05 ** 2))
+            expected.append(discretize_neuron_current(neuron['pts'], neuron['tangents'], waveform)[2])
+        assert np.array_equal(currents[ti], np.concatenate(expected))
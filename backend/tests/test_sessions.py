@@ -0,0 +1,94 @@
+import numpy as np
+
+from pipeline import STAGE_CACHE, _simulate
+from server import SimRequest
+from sessions import SessionStore
+from simulation.field import biot_savart_kernel
+
+
+def small_request(**kw):
+    return SimRequest(**dict(dict(n_neurons=10, sensor_res=12, n_time=8), **kw))
+
+
+def kernel_bytes(req):
+    session = SessionStore().create(req)
+    geom = session.geometry
+    return 3 * geom['sensor_points'].shape[0] * geom['table']['start'].shape[0] * np.dtype(req.dtype).itemsize
+
+
+def test_tiled_kernel_matches_whole_block():
+    req = small_request()
+    geom = SessionStore().create(req).geometry
+    table, sensors = geom['table'], geom['sensor_points']
+    whole = biot_savart_kernel(table['start'], table['end'], sensors)
+    tiled = biot_savart_kernel(table['start'], table['end'], sensors, memory_budget=4096)
+    assert np.array_equal(whole, tiled)
+
+
+def test_kernels_share_one_budget():
+    one = kernel_bytes(small_request())
+    store = SessionStore(max_sessions=8, kernel_bytes=2 * one + one // 2)
+    sessions = []
+    for seed in range(5):
+        session = store.create(small_request(rng_seed=seed))
+        session.simulate(1.0, 8)
+        sessions.append(session)
+        retained = sum(s._kernel.nbytes for s in sessions if s._kernel is not None)
+        assert retained == store.kernel_nbytes <= store.kernel_bytes
+    # the most recently used sessions keep their kernels
+    assert [s._kernel is not None for s in sessions] == [False, False, False, True, True]
+
+    # a session whose kernel was dropped still extends correctly
+    STAGE_CACHE.clear()
+    result = sessions[0].simulate(2.0, 12)
+    assert np.array_equal(result['Btime'], _simulate(small_request(rng_seed=0, t_max=2.0, n_time=12))['Btime'])
+    assert store.kernel_nbytes <= store.kernel_bytes
+
+
+def test_no_kernel_beyond_budget_or_without_store():
+    req = small_request()
+    store = SessionStore(kernel_bytes=kernel_bytes(req) - 1)
+    session = store.create(req)
+    session.simulate(1.0, 8)
+    assert session._kernel is None and store.kernel_nbytes == 0
+
+    store = SessionStore(max_sessions=1, kernel_bytes=10 * kernel_bytes(req))
+    first = store.create(req)
+    first.simulate(1.0, 8)
+    assert store.kernel_nbytes > 0
+    store.create(req)
+    assert first._kernel is None and store.kernel_nbytes == 0
+
+
+def window_bytes(req, n_time):
+    return SessionStore().create(req).geometry['sensor_points'].shape[0] * n_time * 3 * np.dtype(req.dtype).itemsize
+
+
+def test_frames_share_one_budget():
+    req = small_request()
+    store = SessionStore(frame_bytes=window_bytes(req, 8) * 5 // 4)
+    session = store.create(req)
+    session.simulate(1.0, 8)
+    STAGE_CACHE.clear()
+    result = session.simulate(2.0, 8)
+    # frames outside the latest window go first
+    assert session.times.size == 8 and store.frame_nbytes <= store.frame_bytes
+    assert np.array_equal(result['Btime'], _simulate(small_request(t_max=2.0))['Btime'])
+
+    store = SessionStore(frame_bytes=window_bytes(req, 8) * 5 // 2)
+    sessions = [store.create(small_request(rng_seed=seed)) for seed in range(3)]
+    for session in sessions:
+        session.simulate(1.0, 8)
+    # then the least recently used sessions
+    assert [store.get(session.id) is session for session in sessions] == [False, True, True]
+    assert store.frame_nbytes <= store.frame_bytes
+
+
+def test_window_beyond_frame_budget_is_not_kept():
+    req = small_request()
+    store = SessionStore(frame_bytes=window_bytes(req, req.n_time) - 1)
+    session = store.create(req)
+    STAGE_CACHE.clear()
+    result = session.simulate(req.t_max, req.n_time)
+    assert store.frame_nbytes == 0 and store.get(session.id) is session
+    assert np.array_equal(result['Btime'], _simulate(req)['Btime'])
@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+import pytest
+
+from pipeline import prepare_geometry
+from server import SimRequest
+from simulation.field import compute_field_timeseries, iter_field_frames
+from streaming import length_prefixed
+
+
+def test_chunked_frames_match_kernel_engine():
+    geom = prepare_geometry(SimRequest(n_neurons=10, sensor_res=12, n_time=11))
+    args = (geom['table']['start'], geom['table']['end'], geom['currents'], geom['sensor_points'])
+    ref = compute_field_timeseries(*args)
+    # a budget too small for the whole kernel takes the chunked path
+    frames = list(iter_field_frames(*args, memory_budget=4096))
+    assert [ti for ti, _ in frames] == list(range(11))
+    assert np.allclose(np.stack([B for _, B in frames], axis=1), ref, rtol=1e-12, atol=0)
+
+
+def test_http_stream_logs_errors(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def messages():
+        yield b'first'
+        raise RuntimeError('boom')
+
+    stream = length_prefixed(messages())
+    assert next(stream) == b'\x05\x00\x00\x00first'
+    with pytest.raises(RuntimeError):
+        next(stream)
+    with open(os.path.join(tmp_path, 'backend_error.log'), encoding='utf-8') as f:
+        assert 'STREAM ERROR' in f.read()
@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+import pipeline
+from server import app
+
+client = TestClient(app)
+BASE = {'n_neurons': 5, 'sensor_res': 8, 'n_time': 4}
+
+
+def test_sweep_rejects_empty_values():
+    for path in ('/sweep', '/jobs/sweep'):
+        r = client.post(path, json={**BASE, 'grid': {'spatial_sigma': []}})
+        assert r.status_code == 422
+        assert 'empty' in r.text
+
+
+def test_sweep_caps_combinations():
+    r = client.post('/sweep', json={**BASE, 'grid': {'noise_level': [0.1] * 20, 'spatial_sigma': [1.0] * 20}})
+    assert r.status_code == 422
+    assert str(pipeline.MAX_SWEEP_VARIANTS) in r.text
+
+
+def test_sweep_still_runs():
+    r = client.post('/sweep', json={**BASE, 'grid': {'spatial_sigma': [0.5, 1.0]}})
+    assert r.status_code == 200
+    assert r.json()['sweep_shape'] == [2]
@@ -0,0 +1,38 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from formats import decode_raw
+from server import app
+
+client = TestClient(app)
+
+
+def rejection(path, send):
+    with client.websocket_connect(path) as ws:
+        send(ws)
+        arrays, header = decode_raw(ws.receive_bytes())
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_bytes()
+    assert arrays == {} and closed.value.code == 1008
+    return header['error']
+
+
+@pytest.mark.parametrize('path', ['/ws/simulate', '/ws/progressive'])
+def test_malformed_messages_get_error_frames(path):
+    assert 'JSON object' in rejection(path, lambda ws: ws.send_json(5))
+    assert 'JSON object' in rejection(path, lambda ws: ws.send_json([{'n_neurons': 5}]))
+    assert 'JSON object' in rejection(path, lambda ws: ws.send_text('not json'))
+    assert 'n_neurons' in rejection(path, lambda ws: ws.send_json({'n_neurons': 'many'}))
+    assert 'quantity' in rejection(path, lambda ws: ws.send_json({'quantity': 'x'}))
+
+
+def test_progressive_rejects_bad_target():
+    assert 'target_ms' in rejection('/ws/progressive', lambda ws: ws.send_json({'target_ms': -1}))
+
+
+def test_valid_request_streams():
+    with client.websocket_connect('/ws/simulate') as ws:
+        ws.send_json({'n_neurons': 3, 'sensor_res': 4, 'n_time': 2, 'quantity': 'df'})
+        _, header = decode_raw(ws.receive_bytes())
+    assert header['n_frames'] == 2